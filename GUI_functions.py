@@ -5,6 +5,18 @@ from PIL import ImageGrab, ImageDraw, ImageFont
 from pytesseract import Output
 import cv2
 import numpy as np
+import os
+import sys
+import string
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+from screen_text_index import ScreenTextIndex
 
 # Update this path to match where Tesseract is installed on your machine.
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
@@ -14,6 +26,185 @@ pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tessera
 # Example for Windows:
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
+# Screen capture backend: "auto" tries dxcam (Windows Desktop Duplication),
+# then mss (GDI / X11), then PIL's ImageGrab.
+CAPTURE_BACKEND = os.getenv("CAPTURE_BACKEND", "auto")
+
+
+def _readonly(arr: np.ndarray) -> np.ndarray:
+    view = arr.view()
+    view.flags.writeable = False
+    return view
+
+
+class ScreenCapture:
+    """
+    Single screen capture service shared by OCR, template matching and the
+    LLM screenshots.
+
+    `grab()` fills one reusable BGRA buffer from the fastest available
+    backend. The RGB, gray, BGR and downscaled versions are derived from it
+    lazily, at most once per frame, into their own reusable buffers and
+    handed out as read-only views, so a step that OCRs, matches templates
+    and sends a screenshot captures once and converts each format once.
+
+    Views are only valid until the next `grab()`; copy anything you keep.
+    """
+
+    def __init__(self, backend: str = CAPTURE_BACKEND):
+        self.backend = backend
+        self.frame_id = 0
+        self._opened = False
+        self._dxcam = None
+        self._bgra = None
+        self._derived = {}    # name -> reusable buffer
+        self._fresh = set()   # names already computed for the current frame
+        self._static = None   # BGRA frame served instead of the screen
+        self._local = threading.local()
+        self._lock = threading.RLock()
+
+    # ---- backends -------------------------------------------------------
+
+    def _open_backend(self):
+        """Resolve the backend to the first one that imports and works."""
+        self._opened = True
+        order = ["dxcam", "mss", "pil"] if self.backend == "auto" else [self.backend]
+        for name in order:
+            try:
+                if name == "dxcam":
+                    import dxcam
+                    self._dxcam = dxcam.create(output_color="BGRA")
+                    if self._dxcam is None:
+                        continue
+                elif name == "mss":
+                    import mss  # noqa: F401
+                self.backend = name
+                return
+            except Exception:
+                continue
+        self.backend = "pil"
+
+    def set_static_frame(self, img):
+        """
+        Serve `img` (RGB array, PIL image or file path) from every grab()
+        instead of the screen, e.g. to replay stored screenshots offline.
+        Pass None to capture the real screen again.
+        """
+        with self._lock:
+            if img is None:
+                self._static = None
+                return
+            if isinstance(img, str):
+                img = Image.open(img)
+            rgb = img if isinstance(img, np.ndarray) else np.asarray(img.convert("RGB"))
+            self._static = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGRA)
+            self._bgra = None
+
+    def _grab_raw(self):
+        """BGRA frame from the backend, or None if the screen has not changed."""
+        if self._static is not None:
+            return self._static
+        if self.backend == "dxcam":
+            return self._dxcam.grab()  # None when there is no new frame
+        if self.backend == "mss":
+            # mss handles are bound to the thread that created them
+            sct = getattr(self._local, "sct", None)
+            if sct is None:
+                import mss
+                sct = self._local.sct = mss.mss()
+            shot = sct.grab(sct.monitors[1])
+            return np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+        return cv2.cvtColor(np.asarray(ImageGrab.grab()), cv2.COLOR_RGB2BGRA)
+
+    # ---- capture --------------------------------------------------------
+
+    def grab(self) -> int:
+        """Capture the screen into the shared buffer. Returns the frame id."""
+        with self._lock:
+            if not self._opened:
+                self._open_backend()
+            raw = self._grab_raw()
+            if raw is None:
+                if self._bgra is not None:
+                    return self.frame_id
+                # dxcam has no frame yet right after start-up
+                raw = cv2.cvtColor(np.asarray(ImageGrab.grab()), cv2.COLOR_RGB2BGRA)
+            if self._bgra is None or self._bgra.shape != raw.shape:
+                self._bgra = np.empty_like(raw)
+                self._derived.clear()
+            np.copyto(self._bgra, raw)
+            self.frame_id += 1
+            self._fresh.clear()
+            return self.frame_id
+
+    def _ensure(self):
+        if self._bgra is None:
+            self.grab()
+
+    def _hw(self):
+        self._ensure()
+        return self._bgra.shape[:2]
+
+    def _derive(self, name: str, shape, convert):
+        """Compute a derived image into its reusable buffer once per frame."""
+        with self._lock:
+            self._ensure()
+            buf = self._derived.get(name)
+            if buf is None or buf.shape != shape:
+                buf = self._derived[name] = np.empty(shape, dtype=np.uint8)
+            if name not in self._fresh:
+                convert(buf)
+                self._fresh.add(name)
+            return _readonly(buf)
+
+    @property
+    def size(self):
+        """(width, height) of the captured screen."""
+        self._ensure()
+        return self._bgra.shape[1], self._bgra.shape[0]
+
+    def bgra(self) -> np.ndarray:
+        self._ensure()
+        return _readonly(self._bgra)
+
+    def rgb(self) -> np.ndarray:
+        h, w = self._hw()
+        return self._derive("rgb", (h, w, 3),
+                            lambda buf: cv2.cvtColor(self._bgra, cv2.COLOR_BGRA2RGB, dst=buf))
+
+    def bgr(self) -> np.ndarray:
+        h, w = self._hw()
+        return self._derive("bgr", (h, w, 3),
+                            lambda buf: cv2.cvtColor(self._bgra, cv2.COLOR_BGRA2BGR, dst=buf))
+
+    def gray(self) -> np.ndarray:
+        h, w = self._hw()
+        return self._derive("gray", (h, w),
+                            lambda buf: cv2.cvtColor(self._bgra, cv2.COLOR_BGRA2GRAY, dst=buf))
+
+    def small(self, factor: int = 4) -> np.ndarray:
+        """Grayscale frame downscaled by `factor`, for cheap change detection."""
+        gray = self.gray()
+        h, w = gray.shape[0] // factor, gray.shape[1] // factor
+        return self._derive(f"small{factor}", (h, w),
+                            lambda buf: cv2.resize(gray, (w, h), dst=buf,
+                                                   interpolation=cv2.INTER_AREA))
+
+    def pil(self) -> Image.Image:
+        """RGB PIL image sharing memory with `rgb()` (no copy)."""
+        rgb = self.rgb()
+        h, w = rgb.shape[:2]
+        return Image.frombuffer("RGB", (w, h), rgb, "raw", "RGB", 0, 1)
+
+
+_CAPTURE = ScreenCapture()
+
+
+def get_screen_capture() -> ScreenCapture:
+    """The process-wide ScreenCapture instance."""
+    return _CAPTURE
+
+
 def click_sequence(keys: list, interval: float = 0.1):
     """
     Presses a combination of keys (e.g., ['ctrl','c']) or single key.
@@ -31,47 +222,458 @@ def click_coords(x: int, y: int, clicks: int = 1, interval: float = 0.0, button:
     pyautogui.click(x=x, y=y, clicks=clicks, interval=interval, button=button)
 
 
-def click_text_image(image_path: str, confidence: float = 0.8):
+# Adaptive waits after an action: poll a downscaled capture until it first
+# changes (the UI may take a while to react at all), then until it has
+# stopped changing, or at most the action's maximum wait.
+SETTLE_TIMEOUTS = {"press": 2.0, "write": 1.0, "click": 3.0}   # seconds, per operation
+SETTLE_DEFAULT_TIMEOUT = float(os.getenv("SETTLE_TIMEOUT", "2"))
+# how long to wait for the first change before taking the screen as unaffected
+SETTLE_CHANGE_TIMEOUTS = {"press": 1.0, "write": 0.3, "click": 1.0}
+SETTLE_DEFAULT_CHANGE_TIMEOUT = 0.5
+SETTLE_STABLE_FOR = 0.15     # how long the frame must stay unchanged after a change
+SETTLE_POLL_INTERVAL = 0.03
+SETTLE_FACTOR = 8            # downscale of the polled frames
+SETTLE_PIXEL_NOISE = 10      # per-pixel difference treated as unchanged
+SETTLE_CHANGED_RATIO = 0.001 # changed pixels tolerated (caret blink, clock)
+
+# unchanged: waits in which the screen never changed
+SETTLE_STATS = {"waits": 0, "timeouts": 0, "unchanged": 0, "total": 0.0}
+
+
+def wait_for_screen_stable(timeout: float = None, op: str = None, debug: bool = True) -> float:
+    """
+    Waits until the screen has reacted and stopped changing, polling a
+    `SETTLE_FACTOR`-times downscaled grayscale capture. A change is more than
+    SETTLE_CHANGED_RATIO of the pixels differing from the last frame.
+
+    It first waits up to SETTLE_CHANGE_TIMEOUTS[op] for a change, and returns
+    if none comes. After a change it returns once the frame stayed unchanged
+    for SETTLE_STABLE_FOR seconds, and at the latest after `timeout`
+    (default: SETTLE_TIMEOUTS[op]).
+
+    Returns the time actually waited, in seconds.
+    """
+    if timeout is None:
+        timeout = SETTLE_TIMEOUTS.get(op, SETTLE_DEFAULT_TIMEOUT)
+    change_timeout = min(timeout, SETTLE_CHANGE_TIMEOUTS.get(op, SETTLE_DEFAULT_CHANGE_TIMEOUT))
+    start = time.perf_counter()
+    _CAPTURE.grab()
+    prev = _CAPTURE.small(SETTLE_FACTOR).copy()
+    last_change = None
+    timed_out = False
+    while True:
+        time.sleep(SETTLE_POLL_INTERVAL)
+        _CAPTURE.grab()
+        frame = _CAPTURE.small(SETTLE_FACTOR)
+        now = time.perf_counter()
+        if frame.shape != prev.shape:
+            changed = True
+        else:
+            diff = cv2.absdiff(prev, frame)
+            changed = np.count_nonzero(diff > SETTLE_PIXEL_NOISE) > SETTLE_CHANGED_RATIO * diff.size
+        if changed:
+            prev = frame.copy()
+            last_change = now
+        if last_change is None:
+            if now - start >= change_timeout:
+                break
+        elif now - last_change >= SETTLE_STABLE_FOR:
+            break
+        if now - start >= timeout:
+            timed_out = True
+            break
+
+    waited = time.perf_counter() - start
+    SETTLE_STATS["waits"] += 1
+    SETTLE_STATS["timeouts"] += timed_out
+    SETTLE_STATS["unchanged"] += last_change is None
+    SETTLE_STATS["total"] += waited
+    if debug:
+        if last_change is None:
+            state = "no change"
+        else:
+            state = "still changing" if timed_out else "settled"
+        print(f"[SETTLE] {op or 'wait'}: {state} after {waited * 1000:.0f} ms")
+    return waited
+
+
+# Text entry for "write" actions: "keys" types the string in one pyautogui
+# call with no delay between keys, "paste" goes through the clipboard
+# (pyperclip), "auto" pastes long text and text pyautogui can't type
+# (non-ASCII, e.g. Russian) and types the rest. An action may carry its own
+# "strategy".
+TEXT_INPUT_STRATEGY = os.getenv("TEXT_INPUT_STRATEGY", "auto")
+TEXT_PASTE_MIN_LENGTH = int(os.getenv("TEXT_PASTE_MIN_LENGTH", "40"))
+TEXT_PASTE_DELAY = 0.1   # seconds before the clipboard is restored
+PASTE_KEYS = ["command", "v"] if sys.platform == "darwin" else ["ctrl", "v"]
+
+TEXT_INPUT_STATS = {"keys": 0, "paste": 0, "chars": 0, "time": 0.0}
+
+
+def can_type(text: str) -> bool:
+    """
+    Whether pyautogui can type every character of `text` as a key press:
+    printable ASCII, capitals and shifted symbols included.
+    """
+    return all(c in string.printable and c not in "\x0b\x0c" for c in text)
+
+
+def _paste_text(text: str):
+    import pyperclip
+    try:
+        previous = pyperclip.paste()
+    except Exception:
+        previous = None
+    pyperclip.copy(text)
+    pyautogui.hotkey(*PASTE_KEYS)
+    if previous is not None:
+        # restoring right away could race the target app reading the clipboard
+        time.sleep(TEXT_PASTE_DELAY)
+        pyperclip.copy(previous)
+
+
+def type_text(text: str, strategy: str = None, debug: bool = True) -> str:
+    """
+    Enters `text` into the focused field with the given strategy ("auto",
+    "keys" or "paste"; default TEXT_INPUT_STRATEGY). Falls back to typing
+    when the clipboard is unavailable.
+
+    Returns the strategy actually used.
+    """
+    strategy = (strategy or TEXT_INPUT_STRATEGY).lower()
+    if strategy not in ("keys", "paste"):
+        strategy = "paste" if len(text) >= TEXT_PASTE_MIN_LENGTH or not can_type(text) else "keys"
+
+    start = time.perf_counter()
+    if strategy == "paste":
+        try:
+            _paste_text(text)
+        except Exception as e:   # pyperclip missing or no clipboard mechanism
+            logging.warning(f"Clipboard paste unavailable, typing instead: {e}")
+            strategy = "keys"
+    if strategy == "keys":
+        if not can_type(text):
+            logging.warning(f"pyautogui can't type every character of {text!r}; some will be skipped")
+        pyautogui.write(text, interval=0)
+    elapsed = time.perf_counter() - start
+
+    TEXT_INPUT_STATS[strategy] += 1
+    TEXT_INPUT_STATS["chars"] += len(text)
+    TEXT_INPUT_STATS["time"] += elapsed
+    if debug:
+        print(f"[INPUT] {strategy}: {len(text)} chars in {elapsed * 1000:.0f} ms")
+    return strategy
+
+
+# Template scales tried by click_text_image (covers 50%-200% DPI scaling),
+# and how many times the screen is halved for the coarse search pass.
+TEMPLATE_SCALES = (0.5, 0.75, 1.0, 1.25, 1.5, 2.0)
+TEMPLATE_PYRAMID_LEVELS = 2
+TEMPLATE_MIN_SIZE = 12  # px; coarser templates than this carry no signal
+
+
+class TemplateRegistry:
+    """
+    Loads click_text_image templates once and keeps their grayscale
+    versions for every (scale, pyramid level) that has been searched.
+    """
+
+    def __init__(self, scales=TEMPLATE_SCALES, levels: int = TEMPLATE_PYRAMID_LEVELS):
+        self.scales = tuple(scales)
+        self.levels = levels
+        self._gray = {}      # path -> grayscale template
+        self._scaled = {}    # (path, scale, level) -> resized template or None
+
+    def load(self, image_path: str) -> np.ndarray:
+        """Grayscale template for `image_path`, read from disk only once."""
+        gray = self._gray.get(image_path)
+        if gray is None:
+            template = cv2.imread(image_path)
+            if template is None:
+                raise Exception(f"Could not load template image: {image_path}")
+            gray = self._gray[image_path] = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
+        return gray
+
+    def preload(self, image_paths):
+        """Load and pre-scale templates ahead of time."""
+        for path in image_paths:
+            for scale in self.scales:
+                for level in range(self.levels + 1):
+                    self.scaled(path, scale, level)
+
+    def scaled(self, image_path: str, scale: float, level: int = 0):
+        """Template resized by `scale` / 2**level, or None if too small."""
+        key = (image_path, scale, level)
+        if key not in self._scaled:
+            gray = self.load(image_path)
+            f = scale / (2 ** level)
+            h, w = int(round(gray.shape[0] * f)), int(round(gray.shape[1] * f))
+            if min(h, w) < TEMPLATE_MIN_SIZE:
+                self._scaled[key] = None
+            elif (h, w) == gray.shape:
+                self._scaled[key] = gray
+            else:
+                interp = cv2.INTER_AREA if f < 1 else cv2.INTER_LINEAR
+                self._scaled[key] = cv2.resize(gray, (w, h), interpolation=interp)
+        return self._scaled[key]
+
+    def match(self, screen_gray: np.ndarray, image_path: str, scales=None, top_k: int = 3):
+        """
+        Coarse-to-fine multi-scale search of `image_path` in `screen_gray`.
+
+        Every scale is matched on a 2**levels downscaled screen; the `top_k`
+        best scales are then refined at full resolution in a small window
+        around their coarse hit.
+
+        Returns:
+            (score, x, y, w, h) of the best full-resolution match, or None.
+        """
+        scales = tuple(scales or self.scales)
+        sh, sw = screen_gray.shape[:2]
+
+        pyramid = [screen_gray]
+        for _ in range(self.levels):
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+
+        coarse = []  # (score, scale, level, x, y) with x, y at full resolution
+        for scale in scales:
+            full = self.scaled(image_path, scale, 0)
+            if full is None or full.shape[0] > sh or full.shape[1] > sw:
+                continue
+            # pick the coarsest level the template still survives at
+            level = next(l for l in range(self.levels, -1, -1)
+                         if l == 0 or self.scaled(image_path, scale, l) is not None)
+            tmpl = self.scaled(image_path, scale, level)
+            level_img = pyramid[level]
+            if tmpl.shape[0] > level_img.shape[0] or tmpl.shape[1] > level_img.shape[1]:
+                continue
+            result = cv2.matchTemplate(level_img, tmpl, cv2.TM_CCOEFF_NORMED)
+            _, score, _, (x, y) = cv2.minMaxLoc(result)
+            coarse.append((score, scale, level, x * 2 ** level, y * 2 ** level))
+
+        best = None
+        for score, scale, level, x, y in sorted(coarse, reverse=True)[:top_k]:
+            tmpl = self.scaled(image_path, scale, 0)
+            th, tw = tmpl.shape[:2]
+            if level == 0:
+                candidate = (score, x, y, tw, th)
+            else:
+                # refine in a window of a few coarse pixels around the hit
+                margin = 2 ** (level + 1)
+                l, t = max(0, x - margin), max(0, y - margin)
+                r, b = min(sw, x + tw + margin), min(sh, y + th + margin)
+                if r - l < tw or b - t < th:
+                    continue
+                result = cv2.matchTemplate(screen_gray[t:b, l:r], tmpl, cv2.TM_CCOEFF_NORMED)
+                _, fine, _, (fx, fy) = cv2.minMaxLoc(result)
+                candidate = (fine, l + fx, t + fy, tw, th)
+            if best is None or candidate[0] > best[0]:
+                best = candidate
+        return best
+
+
+_TEMPLATES = TemplateRegistry()
+
+
+def locate_text_image(image_path: str, confidence: float = 0.8, region=None, scales=None):
+    """
+    Finds the template image on screen across scales and returns the center
+    (x, y) of the best match, or None if nothing reaches `confidence`.
+
+    Args:
+        image_path (str): Path to the small screenshot of the text/button.
+        confidence (float): Minimum normalized match score (0.0 to 1.0).
+        region: Optional (left, top, width, height) to search within.
+        scales: Template scales to try; defaults to TEMPLATE_SCALES.
+    """
+    _CAPTURE.grab()
+    screen = _CAPTURE.gray()
+    ox, oy = 0, 0
+    if region is not None:
+        ox, oy, w, h = region
+        screen = screen[oy:oy + h, ox:ox + w]
+
+    best = _TEMPLATES.match(screen, image_path, scales)
+    if best is None or best[0] < confidence:
+        return None
+    _, x, y, w, h = best
+    return ox + x + w // 2, oy + y + h // 2
+
+
+def click_text_image(image_path: str, confidence: float = 0.8, region=None, scales=None):
     """
     Finds the best match of the given template image on screen and clicks its center.
+    The template is searched at several scales (DPI scaling), coarse-to-fine.
     
     Args:
         image_path (str): Path to the small screenshot of the text/button.
         confidence (float): Minimum normalized match score (0.0 to 1.0).
+        region: Optional (left, top, width, height) to search within.
+        scales: Template scales to try; defaults to TEMPLATE_SCALES.
     
     Raises:
         Exception: If no match at or above confidence is found.
     """
-    # 1) grab full screen and convert to BGR numpy array
-    screen_pil = ImageGrab.grab()
-    screen_np = cv2.cvtColor(np.array(screen_pil), cv2.COLOR_RGB2BGR)
-
-    # 2) load template (our image snippet)
-    template = cv2.imread(image_path)
-    if template is None:
-        raise Exception(f"Could not load template image: {image_path}")
-    th, tw = template.shape[:2]
-
-    # 3) do template matching
-    result = cv2.matchTemplate(screen_np, template, cv2.TM_CCOEFF_NORMED)
-    # find all locations above threshold
-    ys, xs = np.where(result >= confidence)
-    if len(xs) == 0:
+    center = locate_text_image(image_path, confidence, region, scales)
+    if center is None:
         raise Exception(f"Image '{image_path}' not found on screen (conf >= {confidence})")
 
-    # 4) collect (score, x, y) for each hit
-    hits = [(result[y, x], x, y) for x, y in zip(xs, ys)]
-    # sort by score desc, then y asc, then x asc
-    hits.sort(key=lambda h: (-h[0], h[2], h[1]))
+    pyautogui.click(*center)
+
+
+
+# Tiled Tesseract: split tall frames into overlapping horizontal strips and
+# OCR them in parallel. Each strip is handed to its own tesseract process, so
+# a thread pool is enough to keep every core busy.
+TESSERACT_TILED = True
+TESSERACT_WORKERS = os.cpu_count() or 4
+TESSERACT_MIN_STRIP = 240   # px; frames shorter than two strips are OCRed in one go
+TESSERACT_OVERLAP = 48      # px; must exceed the tallest line of text
+
+_TESSERACT_POOL = None
+
+
+def _tesseract_pool():
+    global _TESSERACT_POOL
+    if _TESSERACT_POOL is None:
+        _TESSERACT_POOL = ThreadPoolExecutor(max_workers=TESSERACT_WORKERS,
+                                             thread_name_prefix="tesseract")
+    return _TESSERACT_POOL
+
+
+def _tesseract_strips(height: int, n: int, overlap: int):
+    """
+    Splits [0, height) into `n` strips. Returns (top, bottom, own_top, own_bottom)
+    for each: the strip actually OCRed and the band whose words it keeps.
+    """
+    bounds = [round(i * height / n) for i in range(n + 1)]
+    strips = []
+    for i in range(n):
+        own_top, own_bottom = bounds[i], bounds[i + 1]
+        strips.append((max(0, own_top - overlap), min(height, own_bottom + overlap),
+                       own_top, own_bottom))
+    return strips
+
+
+def _tesseract_image_to_data(img, lang: str = 'eng', tiled: bool = None) -> dict:
+    """
+    `pytesseract.image_to_data(..., output_type=Output.DICT)` that optionally
+    OCRs the frame as overlapping strips in parallel.
+
+    Words are kept only by the strip that owns their vertical center, which
+    drops the duplicates read twice in an overlap. Block numbers are
+    renumbered per strip so (block_num, line_num) stays a unique line key.
+    """
+    if tiled is None:
+        tiled = TESSERACT_TILED
+    img = np.asarray(img)
+    height = img.shape[0]
+    n = min(TESSERACT_WORKERS, height // TESSERACT_MIN_STRIP)
+    if not tiled or n < 2:
+        return pytesseract.image_to_data(img, lang=lang, output_type=Output.DICT)
+
+    strips = _tesseract_strips(height, n, TESSERACT_OVERLAP)
+    futures = [
+        _tesseract_pool().submit(pytesseract.image_to_data, img[top:bottom],
+                                 lang=lang, output_type=Output.DICT)
+        for top, bottom, _, _ in strips
+    ]
+
+    merged = None
+    for strip_idx, ((top, _, own_top, own_bottom), future) in enumerate(zip(strips, futures)):
+        data = future.result()
+        if merged is None:
+            merged = {key: [] for key in data}
+        for i in range(len(data['text'])):
+            center_y = top + data['top'][i] + data['height'][i] / 2
+            if not own_top <= center_y < own_bottom:
+                continue
+            for key in merged:
+                merged[key].append(data[key][i])
+            merged['top'][-1] += top
+            merged['block_num'][-1] += strip_idx * 10000
+    return merged
+
+
+def _tesseract_words(img, lang: str = 'eng'):
+    """
+    Runs Tesseract on `img` and returns its non-empty words in the same
+    (bbox, text, conf) shape EasyOCR uses, bbox being four [x, y] points.
+    """
+    data = _tesseract_image_to_data(img, lang=lang)
+    words = []
+    for i, word in enumerate(data['text']):
+        w = word.strip()
+        if not w:
+            continue
+        l, t = data['left'][i], data['top'][i]
+        r, b = l + data['width'][i], t + data['height'][i]
+        words.append(([[l, t], [r, t], [r, b], [l, b]], w, int(data['conf'][i] or -1)))
+    return words
+
 
-    # 5) pick the best hit and compute its center
-    best_score, bx, by = hits[0]
-    center_x = bx + tw // 2
-    center_y = by + th // 2
+_TESSERACT_INCREMENTAL = {}
 
-    # 6) click it
-    pyautogui.click(center_x, center_y)
 
+def _tesseract_incremental(lang: str):
+    """One IncrementalOCR engine per Tesseract language."""
+    if lang not in _TESSERACT_INCREMENTAL:
+        _TESSERACT_INCREMENTAL[lang] = IncrementalOCR(lambda img: _tesseract_words(img, lang))
+    return _TESSERACT_INCREMENTAL[lang]
+
+
+def _detect_text_regions(gray: np.ndarray):
+    """
+    Cheap OpenCV text detector for the Tesseract path: morphological
+    gradient, Otsu threshold, then a horizontal close to join letters into
+    words/lines. Returns (l, t, r, b) boxes.
+    """
+    grad = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT,
+                            cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+    _, bw = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    joined = cv2.morphologyEx(bw, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 1)))
+    contours = cv2.findContours(joined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[-2]
+    boxes = []
+    for contour in contours:
+        x, y, w, h = cv2.boundingRect(contour)
+        if w >= 4 and 3 <= h <= gray.shape[0] // 4:
+            boxes.append((x, y, x + w, y + h))
+    return boxes
+
+
+def _tesseract_recognize_crops(img: np.ndarray, boxes, lang: str = 'eng'):
+    """
+    Reads each (l, t, r, b) crop as a single text line (--psm 7), in
+    parallel. Returns a (bbox, text, conf) per word, with the word's own box
+    in frame coordinates.
+    """
+    futures = [
+        _tesseract_pool().submit(pytesseract.image_to_data, img[t:b, l:r], lang=lang,
+                                 config="--psm 7", output_type=Output.DICT)
+        for l, t, r, b in boxes
+    ]
+    results = []
+    for (l, t, r, b), future in zip(boxes, futures):
+        data = future.result()
+        for k, word in enumerate(data['text']):
+            w = word.strip()
+            if not w:
+                continue
+            wl, wt = l + data['left'][k], t + data['top'][k]
+            wr, wb = wl + data['width'][k], wt + data['height'][k]
+            results.append(([[wl, wt], [wr, wt], [wr, wb], [wl, wb]], w, int(data['conf'][k] or -1)))
+    return results
+
+
+_TESSERACT_TWO_RES = {}
+
+
+def _tesseract_two_res(lang: str, factor: int):
+    """One TwoResolutionOCR engine per (language, downscale factor)."""
+    if (lang, factor) not in _TESSERACT_TWO_RES:
+        _TESSERACT_TWO_RES[(lang, factor)] = TwoResolutionOCR(
+            _detect_text_regions, lambda img, boxes: _tesseract_recognize_crops(img, boxes, lang), factor)
+    return _TESSERACT_TWO_RES[(lang, factor)]
 
 
 def click_one_word_ocr(
@@ -79,53 +681,49 @@ def click_one_word_ocr(
     lang: str = 'eng',
     *,
     debug: bool = True,
-    min_confidence: int = 50
+    min_confidence: int = 50,
+    max_distance: int = None,
+    downscale: int = None,
+    dry_run: bool = False
 ):
     """
     Finds `text` on the screen via OCR (case-insensitive, substring match)
     and clicks the occurrence with the highest confidence, then largest size,
-    then top-most, then left-most.
+    then top-most, then left-most. If nothing contains `text` exactly, the
+    closest word within `max_distance` typos is used.
+    With `downscale` > 1, text regions are found on a reduced frame and only
+    the ones that could hold `text` are OCRed.
+
+    With `dry_run`, returns the (x, y) it would click instead of clicking.
     """
-    target = text.lower()
-    img = ImageGrab.grab()
-    data = pytesseract.image_to_data(img, lang=lang, output_type=Output.DICT)
+    if downscale is None:
+        downscale = OCR_DETECT_DOWNSCALE
+    _CAPTURE.grab()
+    if downscale > 1:
+        words = _tesseract_two_res(lang, downscale).read(_CAPTURE.gray(), text, debug=debug)
+    else:
+        # only the parts of the screen that changed since the last call are re-OCRed
+        words = _tesseract_incremental(lang).read(_CAPTURE.rgb(), debug)
+    index = ScreenTextIndex.from_ocr(words)
 
-    candidates = []
-    # collect matches
-    for i, word in enumerate(data['text']):
-        w = word.strip()
-        if not w:
-            continue
-        conf = int(data['conf'][i] or -1)
-        wl = w.lower()
-        if debug:
-                print(f"[OCR] '{w}' conf={conf} @ "
-                  f"({data['left'][i]}, {data['top'][i]}, "
-                  f"{data['width'][i]}×{data['height'][i]})")
-        
-        if target in wl:
-           
-            
-            left, top = data['left'][i], data['top'][i]
-            width, height = data['width'][i], data['height'][i]
-            area = width * height
-            # store (conf, area, top, left, bbox)
-            candidates.append((conf, area, top, left, (left, top, width, height)))
-
-    if not candidates:
+    if debug:
+        for e in index.entries:
+            l, t, w, h = e.rect
+            print(f"[OCR] '{e.text}' conf={e.conf} @ ({l}, {t}, {w}×{h})")
+
+    # best by: exact before fuzzy, then largest area, highest confidence,
+    # top-most, left-most
+    match = index.best(text, rank="area", max_distance=max_distance)
+    if match is None:
         print(f"Text '{text}' not found with confidence ≥{min_confidence}")
         return(f"Text '{text}' not found with confidence ≥{min_confidence}")
 
-    # sort by:
-    # 1) confidence desc, 2) area desc (largest box first),
-    # 3) top asc, 4) left asc
-    candidates.sort(key=lambda x: (-x[1], -x[0], x[2], x[3]))
-
-    # pick the best one
-    _, _, _, _, (l, t, w, h) = candidates[0]
+    l, t, w, h = match.entry.rect
     cx = l + w // 2
     cy = t + h // 2
 
+    if dry_run:
+        return cx, cy
     pyautogui.click(cx, cy)
     if debug:
         print(f"Clicked '{text}' at ({cx},{cy}) from bbox {(l, t, w, h)}")
@@ -139,70 +737,58 @@ def click_multi_words_ocr(
     lang: str = 'eng',
     *,
     debug: bool = True,
-    min_confidence: int = 50
+    min_confidence: int = 50,
+    max_distance: int = None,
+    downscale: int = None,
+    dry_run: bool = False
 ):
     """
     Finds `text` on the screen via OCR (case-insensitive, substring match)
-    by grouping words into lines and clicking the best match.
+    by grouping words into lines and clicking the best match. If no line
+    contains `text` exactly, the closest within `max_distance` typos is used.
+    With `downscale` > 1, text regions are found on a reduced frame and only
+    the ones that could hold `text` are OCRed, each as one line.
+
+    With `dry_run`, returns the (x, y) it would click instead of clicking.
     """
-    target = text.lower()
-    img = ImageGrab.grab()
-    data = pytesseract.image_to_data(img, lang=lang, output_type=Output.DICT)
-    n = len(data['text'])
+    if downscale is None:
+        downscale = OCR_DETECT_DOWNSCALE
+    _CAPTURE.grab()
+
+    # 1) Index words and their (block_num, line_num) lines
+    if downscale > 1:
+        # each crop is one line: its words become word entries and their join a line entry
+        crops = _tesseract_two_res(lang, downscale).read(_CAPTURE.gray(), text, debug=debug,
+                                                         grouped=True)
+        index = ScreenTextIndex.from_ocr_lines(crops, min_confidence)
+    else:
+        data = _tesseract_image_to_data(_CAPTURE.rgb(), lang=lang)
+        index = ScreenTextIndex.from_tesseract(data, min_confidence)
+    if debug:
+        for e in index.entries:
+            l, t, w, h = e.rect
+            print(f"[OCR] word='{e.text}' conf={e.conf} block,line={e.line} "
+                  f"@({l}, {t}, {w}×{h})")
 
-    # 1) Group word-indices by (block_num, line_num)
-    lines = {}
-    for i in range(n):
-        w = data['text'][i].strip()
-        if not w:
-            continue
-        conf = int(data['conf'][i] or -1)
-        if conf < min_confidence:
-            continue
-        key = (data['block_num'][i], data['line_num'][i])
-        lines.setdefault(key, []).append(i)
-        if debug:
-            print(f"[OCR] word='{w}' conf={conf} block,line={key} "
-                  f"@({data['left'][i]}, {data['top'][i]}, "
-                  f"{data['width'][i]}×{data['height'][i]})")
-
-    # 2) For each line, build a phrase and see if it contains the target
-    candidates = []
-    for key, idxs in lines.items():
-        # sort by X so words are in reading order
-        idxs = sorted(idxs, key=lambda i: data['left'][i])
-        phrase = " ".join(data['text'][i] for i in idxs).lower()
-
-        if target in phrase:
-            # build a bounding box around all these words
-            lefts   = [data['left'][i] for i in idxs]
-            tops    = [data['top'][i] for i in idxs]
-            rights  = [data['left'][i] + data['width'][i]  for i in idxs]
-            bottoms = [data['top'][i]  + data['height'][i] for i in idxs]
-
-            l, t = min(lefts), min(tops)
-            r, b = max(rights), max(bottoms)
-            w, h = r - l, b - t
-
-            # average confidence, area, y-position, x-position
-            avg_conf = sum(int(data['conf'][i] or 0) for i in idxs) / len(idxs)
-            area     = w * h
-
-            candidates.append((avg_conf, area, t, l, (l, t, w, h)))
-            if debug:
-                print(f"[MATCH] phrase='{phrase}' -> bbox={(l,t,w,h)}, "
-                      f"avg_conf={avg_conf:.1f}, area={area}")
+    # 2) Find lines whose phrase contains the target (or nearly does)
+    matches = index.query(text, rank="conf", lines=True, max_distance=max_distance)
+    if debug:
+        for m in matches:
+            e = m.entry
+            print(f"[MATCH] phrase='{e.text.lower()}' -> bbox={e.rect}, "
+                  f"avg_conf={e.conf:.1f}, area={e.rect[2] * e.rect[3]}, dist={m.distance}")
 
-    if not candidates:
+    if not matches:
         print(f"Text '{text}' not found with confidence ≥{min_confidence}")
         return(f"Text '{text}' not found with confidence ≥{min_confidence}")
 
-    # 3) Pick best by: highest conf, then largest area, then top-most, then left-most
-    candidates.sort(key=lambda x: (-x[0], -x[1], x[2], x[3]))
-    _, _, _, _, (l, t, w, h) = candidates[0]
+    # 3) Pick best by: closest, highest conf, largest area, top-most, left-most
+    l, t, w, h = matches[0].entry.rect
 
     # 4) Click the center
     cx, cy = l + w // 2, t + h // 2
+    if dry_run:
+        return cx, cy
     pyautogui.click(cx, cy)
 
     if debug:
@@ -211,8 +797,8 @@ def click_multi_words_ocr(
     return True
 
 def take_screenshot(path):
-    screenshot = pyautogui.screenshot()
-    screenshot.save(path)
+    _CAPTURE.grab()
+    _CAPTURE.pil().save(path)
 
 # import pyautogui
 # from PIL import ImageGrab, ImageDraw, ImageFont
@@ -293,103 +879,725 @@ def take_screenshot(path):
 
 
 
-import easyocr
 import pyautogui
 from PIL import ImageGrab
 import cv2
 import numpy as np
 from PIL import ImageGrab
 
-_READER = easyocr.Reader(['en'], gpu=True)
+# Device for EasyOCR: "auto" (CUDA if torch sees a GPU, else CPU), "cpu",
+# or an explicit torch device such as "cuda:0" or "mps".
+OCR_DEVICE = os.getenv("OCR_DEVICE", "auto")
+
+# Engine behind the click_easyocr_* functions: "easyocr" (PyTorch) or "onnx"
+# (int8-quantized EasyOCR models on onnxruntime, see onnx_ocr.py).
+OCR_BACKEND = os.getenv("OCR_BACKEND", "easyocr")
+
+_READER = None
+_ONNX_READER = None
+_READER_LOCK = threading.Lock()
+_READER_THREAD = None
+
+
+def _reader_device(device: str = OCR_DEVICE):
+    """Value for easyocr.Reader(gpu=...) for the configured device."""
+    if device == "auto":
+        try:
+            import torch
+            return torch.cuda.is_available()
+        except ImportError:
+            return False
+    if device == "cpu":
+        return False
+    return device
+
+
+def _warmup_image() -> np.ndarray:
+    """Small synthetic text image used to run the networks once after loading."""
+    img = np.full((64, 320), 255, dtype=np.uint8)
+    cv2.putText(img, "Warm up 123", (8, 44), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+    return img
+
+
+def get_reader():
+    """
+    The shared EasyOCR reader, created on first use. Construction loads the
+    detection and recognition models and runs one warm-up inference, so the
+    first real click doesn't pay for lazy initialization inside torch.
+    """
+    global _READER
+    if _READER is None:
+        with _READER_LOCK:
+            if _READER is None:
+                import easyocr
+                start = time.perf_counter()
+                reader = easyocr.Reader(['en'], gpu=_reader_device())
+                reader.readtext(_warmup_image())
+                print(f"[OCR] EasyOCR ready on {reader.device} "
+                      f"in {time.perf_counter() - start:.1f}s")
+                _READER = reader
+    return _READER
+
+
+def get_ocr_engine():
+    """
+    The reader selected by OCR_BACKEND. Anything returned here has an
+    EasyOCR-compatible `readtext(img) -> [(bbox, text, conf), ...]`.
+    """
+    global _ONNX_READER
+    if OCR_BACKEND != "onnx":
+        return get_reader()
+    if _ONNX_READER is None:
+        with _READER_LOCK:
+            if _ONNX_READER is None:
+                from onnx_ocr import OnnxOCR
+                start = time.perf_counter()
+                reader = OnnxOCR()
+                reader.readtext(_warmup_image())
+                print(f"[OCR] ONNX OCR ready in {time.perf_counter() - start:.1f}s")
+                _ONNX_READER = reader
+    return _ONNX_READER
+
+
+def warm_up_reader():
+    """
+    Starts loading the configured OCR reader on a background thread and
+    returns immediately. Call this at app start; the first OCR call waits
+    for it if needed.
+    """
+    global _READER_THREAD
+    if _READER is None and _ONNX_READER is None and _READER_THREAD is None:
+        _READER_THREAD = threading.Thread(target=get_ocr_engine, name="ocr-warmup", daemon=True)
+        _READER_THREAD.start()
+    return _READER_THREAD
+
+# How many distinct frames to remember OCR results for, and for how long (seconds).
+OCR_CACHE_SIZE = 8
+OCR_CACHE_TTL = 30.0
+
+
+def frame_hash(img_np: np.ndarray) -> str:
+    """
+    Fast content hash of a captured frame (shape + raw pixels).
+    Two grabs of an unchanged screen give the same hash.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(img_np.shape).encode())
+    h.update(np.ascontiguousarray(img_np).data)
+    return h.hexdigest()
+
+
+class OCRCache:
+    """
+    LRU cache of OCR results keyed by frame hash, with a time-to-live so
+    results for an old screen are never reused indefinitely.
+    """
+
+    def __init__(self, max_entries: int = OCR_CACHE_SIZE, ttl: float = OCR_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for `key`, or None if missing/expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        """Store `value` under `key`, evicting the least recently used entry."""
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_OCR_CACHE = OCRCache()
+
+
+# Tile size (px) used to diff consecutive frames, and the fraction of dirty
+# tiles above which a full re-OCR is cheaper than patching.
+OCR_TILE_SIZE = 64
+OCR_FULL_REFRESH_RATIO = 0.5
+
+
+def _bbox_rect(bbox):
+    """(left, top, width, height) of a 4-point OCR box."""
+    xs = [pt[0] for pt in bbox]
+    ys = [pt[1] for pt in bbox]
+    return min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys)
+
+
+def _offset_bbox(bbox, dx, dy):
+    return [[pt[0] + dx, pt[1] + dy] for pt in bbox]
+
+
+def _rects_overlap(a, b) -> bool:
+    al, at, aw, ah = a
+    bl, bt, bw, bh = b
+    return al < bl + bw and bl < al + aw and at < bt + bh and bt < at + ah
+
+
+def _union_rect(a, b):
+    l, t = min(a[0], b[0]), min(a[1], b[1])
+    r = max(a[0] + a[2], b[0] + b[2])
+    btm = max(a[1] + a[3], b[1] + b[3])
+    return (int(l), int(t), int(r - l), int(btm - t))
+
+
+def _merge_rects(rects):
+    """Fuse overlapping rectangles until none overlap."""
+    rects = list(rects)
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(rects)):
+            for j in range(i + 1, len(rects)):
+                if _rects_overlap(rects[i], rects[j]):
+                    rects[i] = _union_rect(rects[i], rects.pop(j))
+                    merged = True
+                    break
+            if merged:
+                break
+    return rects
+
+
+class IncrementalOCR:
+    """
+    Incremental OCR between consecutive screenshots.
+
+    Keeps the last frame and its word list. A new frame is compared to the
+    previous one in `tile` x `tile` blocks; only the dirty regions are
+    re-recognized and merged back into the retained words.
+
+    Args:
+        recognize: callable(img) -> list of (bbox, text, conf), with bbox as
+                   four [x, y] points relative to the given image.
+        tile (int): tile edge in pixels used for the block comparison.
+        pad (int): pixels added around each dirty region before re-OCR, so
+                   words cut by a tile edge are read whole.
+        full_ratio (float): dirty-tile fraction above which the whole
+                            frame is re-read instead.
+        noise (int): per-pixel difference treated as unchanged.
+    """
+
+    def __init__(self, recognize, tile: int = OCR_TILE_SIZE, pad: int = 16,
+                 full_ratio: float = OCR_FULL_REFRESH_RATIO, noise: int = 8):
+        self.recognize = recognize
+        self.tile = tile
+        self.pad = pad
+        self.full_ratio = full_ratio
+        self.noise = noise
+        self._prev = None
+        self._words = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self._prev = None
+            self._words = []
+
+    def dirty_tiles(self, frame: np.ndarray) -> np.ndarray:
+        """Boolean (rows, cols) grid of tiles that differ from the previous frame."""
+        diff = cv2.absdiff(self._prev, frame)
+        if diff.ndim == 3:
+            diff = diff.max(axis=2)
+        changed = diff > self.noise
+
+        t = self.tile
+        h, w = changed.shape
+        rows, cols = -(-h // t), -(-w // t)
+        padded = np.zeros((rows * t, cols * t), dtype=bool)
+        padded[:h, :w] = changed
+        return padded.reshape(rows, t, cols, t).any(axis=(1, 3))
+
+    def _dirty_regions(self, grid: np.ndarray, shape):
+        """Merge connected dirty tiles into padded pixel rectangles (l, t, w, h)."""
+        h, w = shape[:2]
+        n, _, stats, _ = cv2.connectedComponentsWithStats(grid.astype(np.uint8), connectivity=8)
+        regions = []
+        for i in range(1, n):  # label 0 is the clean background
+            tx, ty, tw, th = stats[i][:4]
+            l = max(0, tx * self.tile - self.pad)
+            t = max(0, ty * self.tile - self.pad)
+            r = min(w, (tx + tw) * self.tile + self.pad)
+            b = min(h, (ty + th) * self.tile + self.pad)
+            regions.append((l, t, r - l, b - t))
+        return regions
+
+    def read(self, frame: np.ndarray, debug: bool = False):
+        """Return the word list for `frame`, re-reading only what changed."""
+        with self._lock:
+            if self._prev is None or self._prev.shape != frame.shape:
+                words = self.recognize(frame)
+                self._prev, self._words = frame.copy(), list(words)
+                return list(words)
+
+            grid = self.dirty_tiles(frame)
+            ratio = grid.mean()
+            if ratio == 0:
+                return list(self._words)
+            if ratio > self.full_ratio:
+                if debug:
+                    print(f"[OCR] {ratio:.0%} of screen changed, full re-OCR")
+                words = self.recognize(frame)
+                self._prev, self._words = frame.copy(), list(words)
+                return list(words)
+
+            regions = self._dirty_regions(grid, frame.shape)
+            rects = [_bbox_rect(word[0]) for word in self._words]
+            stale = [False] * len(rects)
+            grown = True
+            while grown:
+                # grow regions over any retained word they touch so that word
+                # is re-read in full, then fuse regions that now overlap
+                grown = False
+                for j, rect in enumerate(rects):
+                    if stale[j]:
+                        continue
+                    for i, reg in enumerate(regions):
+                        if _rects_overlap(rect, reg):
+                            regions[i] = _union_rect(reg, rect)
+                            stale[j] = grown = True
+                regions = _merge_rects(regions)
+            kept = [word for word, old in zip(self._words, stale) if not old]
+
+            fresh = []
+            for l, t, w, h in regions:
+                crop = frame[t:t + h, l:l + w]
+                for bbox, detected, conf in self.recognize(crop):
+                    fresh.append((_offset_bbox(bbox, l, t), detected, conf))
+            if debug:
+                print(f"[OCR] re-read {len(regions)} dirty region(s) "
+                      f"({ratio:.0%} of tiles), kept {len(kept)} words")
+
+            self._prev, self._words = frame.copy(), kept + fresh
+            return list(self._words)
+
+
+_EASYOCR_INCREMENTAL = IncrementalOCR(lambda img: get_ocr_engine().readtext(img))
+
+
+# Two-resolution OCR: find text boxes on a frame shrunk by this factor and
+# recognize only the full-resolution crops that could hold the target.
+# 1 disables it.
+OCR_DETECT_DOWNSCALE = int(os.getenv("OCR_DETECT_DOWNSCALE", "1"))
+
+
+def fits_target(rect, text: str, whole: bool = False) -> bool:
+    """
+    Whether a text box (l, t, r, b) is plausibly wide enough to contain
+    `text`: glyphs are roughly 0.25-1.2x as wide as the line is tall. With
+    `whole`, the box must also not be much longer than `text`.
+    """
+    l, t, r, b = rect
+    h = max(1, b - t)
+    n = len(text.strip())
+    if r - l < n * h * 0.25:
+        return False
+    if whole and r - l > (n + 2) * h * 1.2:
+        return False
+    return True
+
+
+class TwoResolutionOCR:
+    """
+    Detects text boxes on a downscaled frame, maps them back to full
+    resolution and recognizes only the crops whose geometry fits the target
+    string. Detection boxes and recognized crops are kept for the current
+    frame, so further targets on the same screen only read new crops.
+
+    Args:
+        detect: callable(img) -> list of (l, t, r, b) boxes in `img` coords.
+        recognize: callable(img, boxes) -> list of (bbox, text, conf) for
+                   the given full-resolution (l, t, r, b) boxes.
+        factor (int): downscale factor for detection.
+    """
+
+    def __init__(self, detect, recognize, factor: int = OCR_DETECT_DOWNSCALE):
+        self.detect = detect
+        self.recognize = recognize
+        self.factor = factor
+        self._frame_key = None
+        self._boxes = []
+        self._read = {}  # box -> list of (bbox, text, conf)
+        self._lock = threading.Lock()
+
+    def boxes(self, img: np.ndarray, key: str = None):
+        """Full-resolution text boxes of `img`, detected on the reduced frame."""
+        key = key or frame_hash(img)
+        if key != self._frame_key:
+            f = self.factor
+            h, w = img.shape[:2]
+            small = cv2.resize(img, (w // f, h // f), interpolation=cv2.INTER_AREA)
+            self._boxes = [
+                (max(0, l * f - f), max(0, t * f - f), min(w, r * f + f), min(h, b * f + f))
+                for l, t, r, b in self.detect(small)
+            ]
+            self._read = {}
+            self._frame_key = key
+        return self._boxes
+
+    def read(self, img: np.ndarray, text: str, whole: bool = False, key: str = None,
+             debug: bool = False, grouped: bool = False):
+        """
+        (bbox, text, conf) results for the crops that could contain `text`;
+        with `grouped`, one list of them per crop.
+        """
+        with self._lock:
+            boxes = self.boxes(img, key)
+            wanted = [box for box in boxes if fits_target(box, text, whole)]
+            todo = [box for box in wanted if box not in self._read]
+            if todo:
+                for box, words in zip(todo, self._group(img, todo)):
+                    self._read[box] = words
+            if debug:
+                print(f"[OCR] {len(boxes)} boxes at 1/{self.factor} scale, "
+                      f"{len(wanted)} fit '{text}', {len(todo)} newly recognized")
+            if grouped:
+                return [self._read[box] for box in wanted]
+            return [word for box in wanted for word in self._read[box]]
+
+    def _group(self, img, boxes):
+        """Recognize `boxes` and split the results back per box."""
+        per_box = [[] for _ in boxes]
+        for bbox, detected, conf in self.recognize(img, boxes):
+            cx = sum(pt[0] for pt in bbox) / len(bbox)
+            cy = sum(pt[1] for pt in bbox) / len(bbox)
+            for i, (l, t, r, b) in enumerate(boxes):
+                if l <= cx <= r and t <= cy <= b:
+                    per_box[i].append((bbox, detected, conf))
+                    break
+        return per_box
+
+
+def _easyocr_detect(img_gray: np.ndarray):
+    """Text boxes (l, t, r, b) from the configured OCR engine's detector."""
+    engine = get_ocr_engine()
+    if OCR_BACKEND == "onnx":
+        return engine.detect(img_gray)
+    horizontal, free = engine.detect(img_gray)
+    boxes = [(int(x0), int(y0), int(x1), int(y1)) for x0, x1, y0, y1 in horizontal[0]]
+    for quad in free[0]:
+        xs = [pt[0] for pt in quad]
+        ys = [pt[1] for pt in quad]
+        boxes.append((int(min(xs)), int(min(ys)), int(max(xs)), int(max(ys))))
+    return boxes
+
+
+def _easyocr_recognize(img_gray: np.ndarray, boxes):
+    """Recognizes only the given (l, t, r, b) crops of a full-resolution frame."""
+    engine = get_ocr_engine()
+    if OCR_BACKEND == "onnx":
+        return [([[l, t], [r, t], [r, b], [l, b]], text, conf)
+                for (l, t, r, b), (text, conf) in zip(boxes, engine.recognize(img_gray, boxes))
+                if text]
+    return engine.recognize(img_gray, horizontal_list=[[l, r, t, b] for l, t, r, b in boxes],
+                            free_list=[])
+
+
+_EASYOCR_TWO_RES = {}
+
+
+def _easyocr_two_res(factor: int) -> TwoResolutionOCR:
+    if factor not in _EASYOCR_TWO_RES:
+        _EASYOCR_TWO_RES[factor] = TwoResolutionOCR(_easyocr_detect, _easyocr_recognize, factor)
+    return _EASYOCR_TWO_RES[factor]
+
+
+def _easyocr_target_index(img_gray: np.ndarray, text: str, downscale: int, whole: bool = False,
+                          debug: bool = False) -> ScreenTextIndex:
+    """
+    Index to look `text` up in: the full-frame index, or with `downscale` > 1
+    one built only from the crops that could hold `text`.
+    """
+    if downscale is None:
+        downscale = OCR_DETECT_DOWNSCALE
+    if downscale > 1:
+        raw = _easyocr_two_res(downscale).read(img_gray, text, whole, debug=debug)
+        return ScreenTextIndex.from_ocr(raw)
+    return _easyocr_index(img_gray, debug)
+
+
+def _read_easyocr_index(img_gray: np.ndarray, key, debug: bool = False) -> ScreenTextIndex:
+    """OCRs a frame (incrementally) and stores its index in the frame-hash cache."""
+    raw = _EASYOCR_INCREMENTAL.read(img_gray, debug)  # list of (bbox, string, conf)
+    index = ScreenTextIndex.from_ocr(raw)
+    _OCR_CACHE.put(key, index)
+    return index
+
+
+def _easyocr_index(img_gray: np.ndarray, debug: bool = False, key: str = None) -> ScreenTextIndex:
+    """
+    ScreenTextIndex of the EasyOCR results for a frame. Identical frames are
+    served from the frame-hash cache, or taken from a speculative OCR of the
+    frame that is still running; otherwise only the regions that changed
+    since the previous frame are re-read.
+    """
+    key = (OCR_BACKEND, key or frame_hash(img_gray))
+    index = _OCR_CACHE.get(key)
+    if index is None:
+        with _OCR_PENDING_LOCK:
+            pending = _OCR_PENDING.get(key)
+        if pending is not None:
+            if debug:
+                print(f"[OCR] waiting for speculative OCR of frame {key[1][:8]}")
+            try:
+                index = pending.result()
+                SPECULATIVE_STATS["used"] += 1
+            except Exception:
+                index = None
+        if index is None:
+            index = _read_easyocr_index(img_gray, key, debug)
+    elif debug:
+        print(f"[OCR] cache hit for frame {key[1][:8]} ({len(index)} boxes)")
+    return index
+
+
+# Speculative OCR: the frame sent to the LLM is OCRed on a background worker
+# while the model call runs, so the clicks in its answer find the index ready.
+OCR_SPECULATIVE = os.getenv("OCR_SPECULATIVE", "1") == "1"
+
+SPECULATIVE_STATS = {"submitted": 0, "used": 0}
+
+_OCR_PENDING = {}   # cache key -> Future of an index being built
+_OCR_PENDING_LOCK = threading.Lock()
+_SPECULATIVE_POOL = None
+
+
+def _speculative_pool():
+    global _SPECULATIVE_POOL
+    if _SPECULATIVE_POOL is None:
+        # one worker: OCR runs are serialized by the incremental engine anyway
+        _SPECULATIVE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-speculative")
+    return _SPECULATIVE_POOL
+
+
+def _speculate(frame: np.ndarray, key, debug: bool) -> ScreenTextIndex:
+    start = time.perf_counter()
+    try:
+        index = _read_easyocr_index(frame, key)
+        if debug:
+            print(f"[OCR] speculative index for frame {key[1][:8]} ready "
+                  f"in {time.perf_counter() - start:.1f}s ({len(index)} boxes)")
+        return index
+    except Exception as e:
+        logging.warning(f"Speculative OCR failed: {e}")
+        raise
+    finally:
+        with _OCR_PENDING_LOCK:
+            _OCR_PENDING.pop(key, None)
+
+
+def prefetch_ocr(img_gray: np.ndarray = None, debug: bool = True):
+    """
+    Starts OCRing `img_gray` (default: a fresh capture) on the background
+    worker and returns its Future, or None if OCR_SPECULATIVE is off or the
+    frame is already being read. Lookups of the same frame then wait for
+    it instead of OCRing again; a frame that changed afterwards is diffed
+    against it, so only the changed regions are re-read.
+    """
+    if not OCR_SPECULATIVE:
+        return None
+    if img_gray is None:
+        img_gray = _grab_gray()
+    frame = np.array(img_gray)  # capture buffers are reused by the next grab()
+    key = (OCR_BACKEND, frame_hash(frame))
+    with _OCR_PENDING_LOCK:
+        if key in _OCR_PENDING:
+            return None
+        future = _OCR_PENDING[key] = _speculative_pool().submit(_speculate, frame, key, debug)
+    SPECULATIVE_STATS["submitted"] += 1
+    return future
+
+
+def reset_ocr_state():
+    """
+    Forgets every cached OCR result and retained frame (frame-hash cache,
+    incremental and two-resolution engines), so the next lookup runs cold.
+    """
+    _OCR_CACHE.clear()
+    _EASYOCR_INCREMENTAL.reset()
+    _EASYOCR_TWO_RES.clear()
+    for engine in _TESSERACT_INCREMENTAL.values():
+        engine.reset()
+    _TESSERACT_TWO_RES.clear()
+
+
+def _grab_gray() -> np.ndarray:
+    """Grabs the full screen as a grayscale NumPy array for EasyOCR."""
+    _CAPTURE.grab()
+    return _CAPTURE.gray()
+
+
+def _match_easyocr_one_word(index: ScreenTextIndex, text: str, min_confidence: float = 0.4,
+                            debug: bool = True, max_distance: int = None):
+    """
+    Picks the box containing `text` (exactly, else within `max_distance`
+    typos), trying largest then highest-confidence boxes first.
+    Returns its center (cx, cy) or None.
+    """
+    match = index.best(text, rank="area", min_confidence=min_confidence,
+                       max_distance=max_distance)
+    if match is None:
+        if debug:
+            print(f"No match for '{text}' with conf ≥{min_confidence}")
+        return None
+
+    e = match.entry
+    cx, cy = e.center
+    if debug:
+        print(f"[OCR] match='{e.text}' conf={e.conf:.2f} area={e.rect[2] * e.rect[3]} "
+              f"dist={match.distance} → click=({cx},{cy})")
+    return cx, cy
+
 
 def click_easyocr_one_word(
     text: str,
     debug: bool = True,
-    min_confidence: float = 0.4
+    min_confidence: float = 0.4,
+    max_distance: int = None,
+    downscale: int = None,
+    dry_run: bool = False
 ) -> bool:
     """
     Finds a substring `text` in any OCR result, but tries largest
-    then highest-confidence boxes first.
+    then highest-confidence boxes first. Falls back to near matches
+    (up to `max_distance` typos) when there is no exact one.
+    With `downscale` > 1, text is detected on a reduced frame and only
+    crops that could hold `text` are recognized.
+
+    With `dry_run`, returns the (x, y) it would click instead of clicking.
     """
     # 1) grab screen & prep for EasyOCR
-    img_pil  = ImageGrab.grab()
-    img_np   = np.array(img_pil)  
-    img_gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
-
-    # 2) run OCR
-    raw = _READER.readtext(img_gray)  # list of (bbox, string, conf)
-
-    # 3) compute area & collect
-    scored = []
-    for bbox, detected, conf in raw:
-        xs = [pt[0] for pt in bbox]
-        ys = [pt[1] for pt in bbox]
-        w = max(xs) - min(xs)
-        h = max(ys) - min(ys)
-        area = w * h
-        scored.append((area, conf, bbox, detected))
-
-    # 4) sort by area DESC, then conf DESC
-    scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
-
-    # 5) scan for your text
-    for area, conf, bbox, detected in scored:
-        if conf < min_confidence:
-            continue
-        if text.lower() in detected.lower():
-            # center point
-            cx = int(sum(pt[0] for pt in bbox) / 4)
-            cy = int(sum(pt[1] for pt in bbox) / 4)
-            if debug:
-                print(f"[OCR] match='{detected}' conf={conf:.2f} area={area} → click=({cx},{cy})")
-            pyautogui.click(cx, cy)
-            return True
+    img_gray = _grab_gray()
+
+    # 2) run OCR (or reuse the index for an identical frame)
+    index = _easyocr_target_index(img_gray, text, downscale, debug=debug)
+
+    # 3) find the best box and click its center
+    coords = _match_easyocr_one_word(index, text, min_confidence, debug, max_distance)
+    if coords is None:
+        return False
+    if dry_run:
+        return coords
+    pyautogui.click(*coords)
+    return True
 
-    if debug:
-        print(f"No match for '{text}' with conf ≥{min_confidence}")
-    return False
+
+class BatchClickResolver:
+    """
+    Resolves every click target of an action plan from a single capture and
+    OCR pass.
+
+    All `texts` are located together the first time one is needed. Before
+    each later lookup the screen is grabbed again (cheap) and hashed; only
+    if an earlier action changed it are the targets re-resolved, and then
+    through the incremental OCR path.
+
+    Usage:
+        resolver = BatchClickResolver(["Search", "Vault"])
+        resolver.click("Search")
+    """
+
+    def __init__(self, texts, debug: bool = True, min_confidence: float = 0.4):
+        self.texts = list(dict.fromkeys(texts))
+        self.debug = debug
+        self.min_confidence = min_confidence
+        self.ocr_passes = 0
+        self._frame_key = None
+        self._coords = {}
+
+    def refresh(self):
+        """Re-resolves all targets if the screen differs from the last OCR pass."""
+        img_gray = _grab_gray()
+        key = frame_hash(img_gray)
+        if key == self._frame_key:
+            return
+        index = _easyocr_index(img_gray, self.debug, key)
+        self.ocr_passes += 1
+        self._frame_key = key
+        self._coords = {
+            text: _match_easyocr_one_word(index, text, self.min_confidence, self.debug)
+            for text in self.texts
+        }
+
+    def locate(self, text: str):
+        """Center (cx, cy) of `text` on the current screen, or None."""
+        if text not in self.texts:
+            self.texts.append(text)
+            self._frame_key = None
+        self.refresh()
+        return self._coords.get(text)
+
+    def click(self, text: str) -> bool:
+        coords = self.locate(text)
+        if coords is None:
+            return False
+        pyautogui.click(*coords)
+        return True
+
+
+def resolve_click_targets(texts, debug: bool = True, min_confidence: float = 0.4) -> dict:
+    """
+    Locates all `texts` on the current screen with one capture and one OCR
+    pass. Returns {text: (cx, cy) or None}.
+    """
+    resolver = BatchClickResolver(texts, debug=debug, min_confidence=min_confidence)
+    resolver.refresh()
+    return dict(resolver._coords)
 
 
 def click_easyocr_multi_words(
     text: str,
     debug: bool = True,
-    min_confidence: float = 0.5
+    min_confidence: float = 0.5,
+    max_distance: int = None,
+    downscale: int = None,
+    dry_run: bool = False
 ) -> bool:
     """
     Finds an *exact* multi-word `text` match, but tries the largest,
-    highest-confidence boxes first.
-    """
-    target = text.lower().split()
-
-    img_pil  = ImageGrab.grab()
-    img_np   = np.array(img_pil)
-    img_gray = cv2.cvtColor(img_np, cv2.COLOR_RGB2GRAY)
+    highest-confidence boxes first. Falls back to a whole-box match within
+    `max_distance` typos when there is no exact one.
+    With `downscale` > 1, text is detected on a reduced frame and only
+    crops about as long as `text` are recognized.
 
-    raw = _READER.readtext(img_gray)
-
-    scored = []
-    for bbox, detected, conf in raw:
-        words = detected.lower().split()
-        xs = [pt[0] for pt in bbox]
-        ys = [pt[1] for pt in bbox]
-        w = max(xs) - min(xs)
-        h = max(ys) - min(ys)
-        area = w * h
-        scored.append((area, conf, bbox, words, detected))
+    With `dry_run`, returns the (x, y) it would click instead of clicking.
+    """
+    img_gray = _grab_gray()
 
-    scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+    index = _easyocr_target_index(img_gray, text, downscale, whole=True, debug=debug)
 
-    for area, conf, bbox, words, detected in scored:
-        if conf < min_confidence:
-            continue
-        if words == target:
-            cx = int(sum(pt[0] for pt in bbox) / 4)
-            cy = int(sum(pt[1] for pt in bbox) / 4)
-            if debug:
-                print(f"[MATCH] '{detected}' conf={conf:.2f} area={area} → click=({cx},{cy})")
-            pyautogui.click(cx, cy)
-            return True
+    match = index.best(text, whole=True, rank="area", min_confidence=min_confidence,
+                       max_distance=max_distance)
+    if match is not None:
+        e = match.entry
+        cx, cy = e.center
+        if debug:
+            print(f"[MATCH] '{e.text}' conf={e.conf:.2f} area={e.rect[2] * e.rect[3]} "
+                  f"dist={match.distance} → click=({cx},{cy})")
+        if dry_run:
+            return cx, cy
+        pyautogui.click(cx, cy)
+        return True
 
     if debug:
         print(f"No exact multi-word match for '{text}' with conf ≥{min_confidence}")
-    return False
\ No newline at end of file
+    return False
@@ -1,14 +1,224 @@
 import os
+import io
+import time
+import json
 import base64
 from dotenv import load_dotenv
 
-from openai import OpenAI
-from GUI_functions import take_screenshot
+import cv2
+import numpy as np
+
+from GUI_functions import get_screen_capture, prefetch_ocr
+from functions import repair_json
+from prompt_cache import (
+    GeminiContextCache,
+    FakeOpenAIClient,
+    FakeGeminiModel,
+    record_ttft,
+)
+from llm_client import LLMClient, LLMRequest, OpenAIProvider, GeminiProvider
 from PIL import Image
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# LLM_OFFLINE=1 swaps both providers for local stand-ins (see prompt_cache.py)
+LLM_OFFLINE = os.getenv("LLM_OFFLINE", "0") == "1"
+
+# OpenAI over a pooled HTTP client; calls go through LLMClient (llm_client.py)
+# for deadlines, retries, fallback and hedging.
+_openai_provider = OpenAIProvider(client=FakeOpenAIClient() if LLM_OFFLINE else None)
+client = _openai_provider.client
+
+# Screenshot payload sent to the LLMs: format (JPEG/WEBP/PNG), longest edge
+# in pixels (0 keeps the native size) and lossy quality.
+SCREENSHOT_FORMAT = os.getenv("SCREENSHOT_FORMAT", "JPEG")
+SCREENSHOT_LONG_EDGE = int(os.getenv("SCREENSHOT_LONG_EDGE", "1568"))
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "80"))
+
+# Details of the last screenshot sent, for monitoring payload size.
+LAST_SCREENSHOT = {}
+
+
+def encode_screenshot(img=None, fmt: str = None, long_edge: int = None, quality: int = None) -> dict:
+    """
+    Encodes a screenshot in memory for an LLM request, without touching disk.
+
+    Args:
+        img (PIL.Image): image to encode; defaults to a fresh screen capture.
+        fmt (str): "JPEG", "WEBP" or "PNG".
+        long_edge (int): resize so the longest side is at most this many pixels.
+        quality (int): JPEG/WebP quality (1-100).
+
+    Returns:
+        dict: {"data": bytes, "mime_type": str, "size": (w, h), "bytes": int}
+    """
+    fmt = (fmt or SCREENSHOT_FORMAT).upper()
+    long_edge = SCREENSHOT_LONG_EDGE if long_edge is None else long_edge
+    quality = SCREENSHOT_QUALITY if quality is None else quality
+
+    if img is None:
+        capture = get_screen_capture()
+        capture.grab()
+        img = capture.pil()
+    shot = _encode_image(img, fmt, long_edge, quality)
+
+    LAST_SCREENSHOT.clear()
+    LAST_SCREENSHOT.update({"format": fmt, "size": shot["size"], "bytes": shot["bytes"]})
+    print(f"[LLM] screenshot {fmt} {shot['size'][0]}x{shot['size'][1]} q={quality}: {shot['bytes'] / 1024:.0f} KB")
+    return shot
+
+
+def _encode_image(img, fmt: str, long_edge: int, quality: int) -> dict:
+    """Resizes and encodes `img`; the encode_screenshot result without its bookkeeping."""
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+
+    w, h = img.size
+    if long_edge and max(w, h) > long_edge:
+        scale = long_edge / max(w, h)
+        img = img.resize((round(w * scale), round(h * scale)), Image.LANCZOS)
+
+    buf = io.BytesIO()
+    if fmt == "PNG":
+        img.save(buf, format="PNG", optimize=False)
+    else:
+        img.save(buf, format=fmt, quality=quality)
+    data = buf.getvalue()
+    return {"data": data, "mime_type": f"image/{fmt.lower()}", "size": img.size, "bytes": len(data)}
+
+
+# Screen-diff payloads: instead of the full frame, send a crop of the region
+# that changed since the last screenshot sent plus a small thumbnail of the
+# whole screen. Falls back to the full frame when more than
+# SCREENSHOT_DIFF_FULL_RATIO of the screen changed.
+SCREENSHOT_DIFF_MODE = os.getenv("SCREENSHOT_DIFF_MODE", "0") == "1"
+SCREENSHOT_DIFF_FULL_RATIO = float(os.getenv("SCREENSHOT_DIFF_FULL_RATIO", "0.4"))
+SCREENSHOT_DIFF_THUMB_EDGE = int(os.getenv("SCREENSHOT_DIFF_THUMB_EDGE", "512"))
+SCREENSHOT_DIFF_PAD = 48        # pixels added around the changed region
+SCREENSHOT_DIFF_NOISE = 16      # gray-level change ignored as noise
+SCREENSHOT_DIFF_FACTOR = 4      # change detection runs on a 1/4 frame
+
+# Downscaled copy of the last frame sent to the model.
+_SENT_FRAME = {"small": None}
+
+
+def reset_screenshot_diff():
+    """Forget the last sent frame; the next payload is a full screenshot."""
+    _SENT_FRAME["small"] = None
+
+
+def _changed_rect(prev, cur, factor: int):
+    """Bounding (left, top, right, bottom) of changed pixels, in full-frame pixels, or None."""
+    diff = cv2.absdiff(prev, cur)
+    mask = (diff > SCREENSHOT_DIFF_NOISE).astype(np.uint8)
+    # drop single-pixel flicker (cursor blink, antialiasing) before taking the bounds
+    mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    ys, xs = np.nonzero(mask)
+    if len(xs) == 0:
+        return None
+    return (int(xs.min()) * factor, int(ys.min()) * factor,
+            (int(xs.max()) + 1) * factor, (int(ys.max()) + 1) * factor)
+
+
+def screenshot_payload(diff: bool = None):
+    """
+    Captures the screen and encodes the image(s) to send with the next turn.
+
+    Args:
+        diff (bool): send only the changed region plus a thumbnail when possible;
+                     defaults to SCREENSHOT_DIFF_MODE.
+
+    Returns:
+        tuple: (note, shots) - `note` is text describing the images for the
+               prompt ("" for a plain full frame) and `shots` a list of
+               `encode_screenshot` results.
+    """
+    diff = SCREENSHOT_DIFF_MODE if diff is None else diff
+    capture = get_screen_capture()
+    capture.grab()
+    # OCR this frame while the model looks at it; its clicks then resolve from the cache
+    prefetch_ocr(capture.gray())
+    img = capture.pil()
+    small = capture.small(SCREENSHOT_DIFF_FACTOR).copy()
+    prev = _SENT_FRAME["small"]
+    _SENT_FRAME["small"] = small
+
+    if not diff or prev is None or prev.shape != small.shape:
+        return "", [encode_screenshot(img)]
+
+    w, h = img.size
+    rect = _changed_rect(prev, small, SCREENSHOT_DIFF_FACTOR)
+    if rect is None:
+        thumb = encode_screenshot(img, long_edge=SCREENSHOT_DIFF_THUMB_EDGE)
+        print("[LLM] screen unchanged, sending thumbnail only")
+        return "The screen has not changed since the previous screenshot (thumbnail attached).", [thumb]
+
+    l, t, r, b = rect
+    l, t = max(0, l - SCREENSHOT_DIFF_PAD), max(0, t - SCREENSHOT_DIFF_PAD)
+    r, b = min(w, r + SCREENSHOT_DIFF_PAD), min(h, b + SCREENSHOT_DIFF_PAD)
+    ratio = (r - l) * (b - t) / float(w * h)
+    if ratio > SCREENSHOT_DIFF_FULL_RATIO:
+        print(f"[LLM] {ratio:.0%} of the screen changed, sending full frame")
+        return "", [encode_screenshot(img)]
+
+    thumb = encode_screenshot(img, long_edge=SCREENSHOT_DIFF_THUMB_EDGE)
+    crop = encode_screenshot(img.crop((l, t, r, b)))
+    print(f"[LLM] sending changed region {r - l}x{b - t} ({ratio:.0%} of screen) "
+          f"+ thumbnail: {(thumb['bytes'] + crop['bytes']) / 1024:.0f} KB")
+    note = (f"Two images are attached: a small thumbnail of the whole {w}x{h} screen, "
+            f"then the part of the screen that changed since the previous screenshot at full detail "
+            f"(left={l}, top={t}, width={r - l}, height={b - t} in screen pixels).")
+    return note, [thumb, crop]
+
+
+
+class StreamedAnswer:
+    """
+    A model answer that is still being generated.
+
+    Iterate it to get the text chunks as they arrive (e.g. through
+    `functions.iter_actions`), then call `finish()` for the usual
+    (answer, history) pair; `finish()` drains whatever was not read yet.
+    """
+
+    def __init__(self, chunks, on_done, on_error=None):
+        self._chunks = chunks
+        self._on_done = on_done
+        self._on_error = on_error
+        self._parts = []
+        self._exhausted = False
+        self.history = None
+        self.started = time.perf_counter()
+        self.ttft = None
+
+    def __iter__(self):
+        try:
+            for chunk in self._chunks:
+                if chunk:
+                    if self.ttft is None:
+                        self.ttft = time.perf_counter() - self.started
+                        record_ttft(self.ttft)
+                    self._parts.append(chunk)
+                    yield chunk
+        except Exception as e:
+            if self._on_error is not None:
+                self._on_error(e)
+            raise
+        self._exhausted = True
+
+    @property
+    def text(self) -> str:
+        """Text received so far."""
+        return "".join(self._parts)
+
+    def finish(self):
+        """Waits for the rest of the answer. Returns (answer, history)."""
+        if not self._exhausted:
+            for _ in self:
+                pass
+        if self.history is None:
+            self.history = self._on_done(self.text)
+        return self.text, self.history
 
 
 
@@ -84,13 +294,172 @@ A few important notes:
 - To order something in the shop, you need to click into its name.
 - If you want to open vault in obsidian app, you need to click to its name.
 
+"""
 
-Objective: {objective} 
+# The objective goes into the first user message rather than the system
+# prompt, so the system prompt is byte-identical for every task and the
+# providers can serve it from their prompt caches.
+OBJECTIVE_PROMPT = """
+Objective: {objective}
 """
 
+STATIC_SYSTEM_PROMPT = SYSTEM_PROMPT_FOR_WTEXT.format(
+    cmd_string="\"ctrl\"",
+    os_search_str="[\"win\"]",
+    operating_system="Windows",
+)
+
+
+
+# ask_gpt4o keeps the whole conversation; before each request it is brought
+# under GPT_HISTORY_BUDGET bytes. The latest GPT_HISTORY_FULL_IMAGES
+# screenshots are kept as sent, older ones shrink to thumbnails and are then
+# dropped, and turns beyond GPT_HISTORY_TURNS are folded into a text summary.
+GPT_HISTORY_BUDGET = int(os.getenv("GPT_HISTORY_BUDGET_KB", "1536")) * 1024
+GPT_HISTORY_FULL_IMAGES = int(os.getenv("GPT_HISTORY_FULL_IMAGES", "2"))
+GPT_HISTORY_TURNS = int(os.getenv("GPT_HISTORY_TURNS", "8"))
+GPT_HISTORY_THUMB_EDGE = 384
+
+SUMMARY_PREFIX = "Summary of earlier steps:"
+
+# Size of the history sent with the last ask_gpt4o request.
+HISTORY_STATS = {"bytes": 0, "messages": 0, "images": 0, "summarized_turns": 0}
+
+
+def _image_parts(message):
+    content = message.get("content")
+    if not isinstance(content, list):
+        return []
+    return [part for part in content if part.get("type") == "image_url"]
+
+
+def message_size(message) -> int:
+    """Bytes a message adds to the request body (base64 images included)."""
+    return len(json.dumps(message, ensure_ascii=False))
+
+
+def history_size(history) -> int:
+    return sum(message_size(m) for m in history)
+
+
+def _shrink_image_part(part, long_edge: int):
+    """Re-encodes a data-URL image part so its longest side is `long_edge`."""
+    url = part["image_url"]["url"]
+    header, data = url.split(",", 1)
+    img = Image.open(io.BytesIO(base64.b64decode(data)))
+    if max(img.size) <= long_edge:
+        return part
+    # not through encode_screenshot: a thumbnail must not count as the step's screenshot
+    shot = _encode_image(img, SCREENSHOT_FORMAT.upper(), long_edge, SCREENSHOT_QUALITY)
+    img64 = base64.b64encode(shot["data"]).decode("utf-8")
+    return {"type": "image_url", "image_url": {"url": f"data:{shot['mime_type']};base64,{img64}"}}
+
+
+def _drop_images(message):
+    content = [part for part in message["content"] if part.get("type") != "image_url"]
+    return dict(message, content=content)
+
 
+def _describe_turn(message) -> str:
+    """One line for the summary: the actions of an answer, or the user's note."""
+    content = message.get("content")
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    content = (content or "").strip()
+    if message["role"] == "assistant":
+        try:
+            actions = json.loads(repair_json(content))
+            actions = actions if isinstance(actions, list) else [actions]
+            steps = []
+            for a in actions:
+                detail = a.get("text") or a.get("content") or a.get("keys") or a.get("summary") or ""
+                steps.append(f"{a.get('operation_type')} {detail}".strip())
+            return "did: " + "; ".join(steps)
+        except (ValueError, AttributeError):
+            return "answered: " + content[:200]
+    if content.startswith(SUMMARY_PREFIX):
+        return content[len(SUMMARY_PREFIX):].strip()
+    # only the part before the standard request says something about the step
+    note = content.split("Please take the next best action")[0].strip()
+    return f"note: {note[:200]}" if note else ""
 
-def ask_gpt4o(aim, prompt="", history=[]):
+
+def compact_history(history, budget: int = None, full_images: int = None, max_turns: int = None):
+    """
+    Brings an OpenAI chat history under `budget` bytes, in place.
+
+    history[0] (system prompt), history[1] (objective) with its answer and
+    the last message (the current request) are never removed. In order:
+    older screenshots beyond the latest `full_images` are shrunk to
+    thumbnails; messages beyond `max_turns` are folded into a summary
+    message; while still over budget, images are dropped oldest first, then
+    more turns are summarized. Turns are folded as whole request/answer
+    pairs, so no answer is left without the request it replies to.
+
+    Returns:
+        list: the same `history` object.
+    """
+    budget = GPT_HISTORY_BUDGET if budget is None else budget
+    full_images = GPT_HISTORY_FULL_IMAGES if full_images is None else full_images
+    max_turns = GPT_HISTORY_TURNS if max_turns is None else max_turns
+    head = 2 if len(history) > 2 and history[0]["role"] == "system" else 1
+    # the first answer stays with the objective request it belongs to
+    if head < len(history) - 1 and history[head]["role"] == "assistant":
+        head += 1
+
+    with_images = [i for i, m in enumerate(history) if _image_parts(m)]
+    for i in with_images[:-full_images or None] if full_images else with_images:
+        content = [_shrink_image_part(part, GPT_HISTORY_THUMB_EDGE) if part.get("type") == "image_url" else part
+                   for part in history[i]["content"]]
+        history[i] = dict(history[i], content=content)
+
+    def summarize(pairs) -> int:
+        """
+        Folds the `pairs` oldest request/answer pairs after the head into the
+        summary message. Returns the number of messages folded.
+        """
+        start = head
+        lines = []
+        if start < len(history) and str(history[start].get("content", "")).startswith(SUMMARY_PREFIX):
+            lines.append(_describe_turn(history[start]))
+            start += 1
+        end = start
+        for _ in range(pairs):
+            if end >= len(history) - 1:
+                break
+            end += 1  # the request
+            while end < len(history) - 1 and history[end]["role"] != "user":
+                end += 1  # its answer
+        folded = history[start:end]
+        if not folded:
+            return 0
+        lines += [line for line in (_describe_turn(m) for m in folded) if line]
+        HISTORY_STATS["summarized_turns"] += len(folded)
+        history[head:end] = [{"role": "user", "content": SUMMARY_PREFIX + "\n" + "\n".join(lines)}]
+        return len(folded)
+
+    turns = len(history) - head - 1
+    if turns > max_turns:
+        summarize((turns - max_turns + 1) // 2)
+
+    for i in range(1, len(history) - 1):
+        if history_size(history) <= budget:
+            break
+        if _image_parts(history[i]):
+            history[i] = _drop_images(history[i])
+
+    while history_size(history) > budget and len(history) - head > 3:
+        if not summarize(1):
+            break
+
+    HISTORY_STATS.update(bytes=history_size(history), messages=len(history),
+                         images=sum(len(_image_parts(m)) for m in history))
+    print(f"[LLM] history {HISTORY_STATS['bytes'] / 1024:.0f} KB, {HISTORY_STATS['messages']} messages, "
+          f"{HISTORY_STATS['images']} images")
+    return history
+
+
+def ask_gpt4o(aim, prompt="", history=[], stream=False):
     # additional prompt
     if prompt == "":
         user_request = """
@@ -103,39 +472,28 @@ def ask_gpt4o(aim, prompt="", history=[]):
 
     # first request
     if history == []:
-        user_request = """
+        reset_screenshot_diff()
+        user_request = OBJECTIVE_PROMPT.format(objective=aim) + """
         Please take the next best action. The `pyautogui` library will be used to execute your decision. Your output will be used in a `json.loads` loads statement. Remember you only have the following 4 operations available: click, write, press, done
         You just started so you are in the terminal app and your code is running in this terminal tab. To leave the terminal, search for a new program on the OS. 
         Action:"""
 
-        history = [{"role": "system", "content": SYSTEM_PROMPT_FOR_WTEXT.format(
-            objective=aim,
-            cmd_string="\"ctrl\"",
-            os_search_str="[\"win\"]",
-            operating_system="Windows",
-        )}]
+        # static prefix: cached by OpenAI's automatic prompt caching across steps and tasks
+        history = [{"role": "system", "content": STATIC_SYSTEM_PROMPT}]
 
     if history != []:
-        screenshots_dir = "screenshots"
-        if not os.path.exists(screenshots_dir):
-            os.makedirs(screenshots_dir)
-
-        screenshot_path = os.path.join(screenshots_dir, "screenshot.png")
-        take_screenshot(screenshot_path)
-
-        with open(screenshot_path, "rb") as img_file:
-            img = base64.b64encode(img_file.read()).decode("utf-8")
-
+        note, shots = screenshot_payload()
+        content = [{"type": "text", "text": user_request + ("\n" + note if note else "")}]
+        for shot in shots:
+            img = base64.b64encode(shot["data"]).decode("utf-8")
+            content.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:{shot['mime_type']};base64,{img}"},
+            })
 
         message = {
                 "role": "user",
-                "content": [
-                    {"type": "text", "text": user_request},
-                    {
-                        "type": "image_url",
-                        "image_url": {"url": f"data:image/jpeg;base64,{img}"},
-                    },
-                ],
+                "content": content,
             }
         
     else:
@@ -147,14 +505,18 @@ def ask_gpt4o(aim, prompt="", history=[]):
             }
     
     history.append(message)
+    compact_history(history)
     
-    response = client.chat.completions.create(
-        model="gpt-4.1-mini-2025-04-14",
-        messages= history,
-        temperature=0.7
-    )
+    request = LLMRequest(openai=history, temperature=0.7)
+    if stream:
+        # hand the text back as it is generated; see StreamedAnswer
+        def on_done(answer):
+            history.append({"role": "assistant", "content": answer})
+            return history
+
+        return StreamedAnswer(_openai_llm.stream(request), on_done)
 
-    answer = response.choices[0].message.content
+    answer = _openai_llm.complete(request)
     history.append({"role": "assistant", "content": answer})
 
     # history = [{"role": "system", "content": SYSTEM_PROMPT_FOR_WTEXT.format(
@@ -228,6 +590,13 @@ def ask_gpt4o(aim, prompt="", history=[]):
 #     history.append({"role": "assistant", "content": answer})
     
 #     return answer, history
+def _is_image_part(part):
+    """PIL images and inline {"mime_type": "image/...", "data": ...} blobs."""
+    if isinstance(part, Image.Image):
+        return True
+    return isinstance(part, dict) and str(part.get("mime_type", "")).startswith("image/")
+
+
 def filter_images(message):
     """
     Helper function to filter out image parts from a message.
@@ -238,7 +607,7 @@ def filter_images(message):
     Returns:
         dict or None: A new message dictionary without image parts, or None if no parts remain.
     """
-    new_parts = [part for part in message["parts"] if not isinstance(part, Image.Image)]
+    new_parts = [part for part in message["parts"] if not _is_image_part(part)]
     if new_parts:
         return {"role": message["role"], "parts": new_parts}
     else:
@@ -250,10 +619,29 @@ import google.generativeai as genai
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
 genai.configure(api_key=GEMINI_API_KEY)
 
-# Initialize the Gemini model globally for efficiency
-_gemini_model = genai.GenerativeModel("gemini-1.5-flash")
+# The static system prompt is a Gemini system instruction kept in a context
+# cache when GEMINI_CONTEXT_CACHE is on and the prompt is long enough;
+# otherwise GeminiContextCache serves the plain GEMINI_MODEL. The model is
+# built on first use and re-bound when the cache expires.
+_gemini_cache = GeminiContextCache(STATIC_SYSTEM_PROMPT)
+_gemini_offline = FakeGeminiModel(STATIC_SYSTEM_PROMPT) if LLM_OFFLINE else None
+
+
+def _gemini_model():
+    return _gemini_offline if LLM_OFFLINE else _gemini_cache.model()
+
+
+_gemini_provider = GeminiProvider(_gemini_model)
+
+# Each provider falls back to (and, with LLM_HEDGE=1, is hedged by) the other
+# one when that one is configured.
+_has_openai = LLM_OFFLINE or bool(os.getenv("OPENAI_API_KEY"))
+_has_gemini = LLM_OFFLINE or bool(GEMINI_API_KEY)
+_gemini_llm = LLMClient(_gemini_provider, _openai_provider if _has_openai else None)
+_openai_llm = LLMClient(_openai_provider, _gemini_provider if _has_gemini else None)
 
-def ask_gemini_flash(aim, prompt="", history=None):
+
+def ask_gemini_flash(aim, prompt="", history=None, stream=False):
     """
     Function to interact with Google's Gemini 1.5 Flash model, mimicking the behavior
     of the original `ask_gpt4o` function.
@@ -265,6 +653,8 @@ def ask_gemini_flash(aim, prompt="", history=None):
         history (list): A list of previous messages in the conversation.
                         For Gemini, messages are dictionaries with "role" ("user" or "model")
                         and "parts" (a list of content elements like text or images).
+        stream (bool): If True, return a `StreamedAnswer` right away instead of
+                       waiting for the whole response.
 
     Returns:
         tuple: A tuple containing:
@@ -294,26 +684,19 @@ def ask_gemini_flash(aim, prompt="", history=None):
     # --- Handle the very first turn of the conversation ---
     # The original `ask_gpt4o` has a special `user_request` and initializes history
     # with a "system" message on the first call (`if history == []`).
-    # For Gemini, system instructions are typically prepended to the first user message.
+    # For Gemini, the system prompt is sent as the model's system instruction instead.
     if not history: # This condition identifies the absolute first call
-        
+        reset_screenshot_diff()
+
         # Specific user request text for the very first turn as per original `ask_gpt4o`
         first_turn_specific_user_request = """
         Please take the next best action. The `pyautogui` library will be used to execute your decision. Your output will be used in a `json.loads` loads statement. Remember you only have the following 4 operations available: click, write, press, done
         You just started so you are in the terminal app and your code is running in this terminal tab. To leave the terminal, search for a new program on the OS. 
         Action:"""
 
-        # Format the system prompt using the `SYSTEM_PROMPT_FOR_WTEXT` global variable
-        initial_system_prompt_formatted = SYSTEM_PROMPT_FOR_WTEXT.format(
-            objective=aim,
-            cmd_string="\"ctrl\"", 
-            os_search_str="[\"win\"]", 
-            operating_system="Windows", 
-        )
-        
-        # Combine the system prompt and the first turn's specific user request.
-        # This combined text forms the primary content of the *first* "user" message.
-        combined_initial_prompt_content = initial_system_prompt_formatted + "\n\n" + first_turn_specific_user_request
+        # The system prompt itself is the model's (cached) system instruction;
+        # the first "user" message carries the objective and the first turn's request.
+        combined_initial_prompt_content = OBJECTIVE_PROMPT.format(objective=aim) + "\n\n" + first_turn_specific_user_request
         current_user_message_parts.append({"text": combined_initial_prompt_content})
         
         # Note: No image is included for the very first turn, mirroring the original logic.
@@ -321,22 +704,14 @@ def ask_gemini_flash(aim, prompt="", history=None):
     # else: # Subsequent turns: include a screenshot and the general user_request_text
     print("HISTORY IS HERE:")
     # print(history)
-    screenshots_dir = "screenshots"
-    if not os.path.exists(screenshots_dir):
-        os.makedirs(screenshots_dir)
-
-    screenshot_path = os.path.join(screenshots_dir, "screenshot.png")
-    take_screenshot(screenshot_path) # Call the imported `take_screenshot` function
-
-    # Convert the screenshot image file into a PIL Image object for Gemini.
-    image_part = Image.open(screenshot_path)
-    # Ensure the image is in RGB format, as some models prefer it
-    if image_part.mode != 'RGB':
-        image_part = image_part.convert('RGB')
-    
+    # Encode the screenshot(s) in memory as inline image blobs for Gemini.
+    note, shots = screenshot_payload()
+    if note:
+        user_request_text += "\n" + note
 
     current_user_message_parts.append({"text": user_request_text}) # Add the general user request text
-    current_user_message_parts.append(image_part) # Add the processed image part
+    for shot in shots:
+        current_user_message_parts.append({"mime_type": shot["mime_type"], "data": shot["data"]}) # Add the processed image part
         
     # Construct the full current user message in Gemini's expected format
     current_user_message_for_gemini = {
@@ -346,49 +721,61 @@ def ask_gemini_flash(aim, prompt="", history=None):
     history.append(current_user_message_for_gemini) # Add the current user message to history
 
     # Make the API call to Gemini 1.5 Flash
-    try:
-        response = _gemini_model.generate_content(
-            history, # Pass the entire conversation history
-            generation_config=genai.types.GenerationConfig(
-                temperature=0.7 # Map OpenAI's temperature setting
-            )
+    # The system prompt only matters if the call falls back to OpenAI;
+    # the Gemini model already carries it as its system instruction.
+    request = LLMRequest(gemini=history, system=STATIC_SYSTEM_PROMPT, temperature=0.7)
+    if stream:
+        return StreamedAnswer(
+            _gemini_llm.stream(request),
+            lambda answer: _gemini_next_history(history, answer),
+            on_error=lambda e: _gemini_call_failed(history, e),
         )
-        
-        # Extract the model's response content.
-        # Gemini's response structure usually involves `candidates[0].content.parts[0].text`.
-        answer = response.candidates[0].content.parts[0].text
-        new_history = []
-
-        # Process the history if it's not empty
-        if history:
-            if len(history) <= 3:
-                selected_messages = history
-            else:
-                selected_indices = [0] + list(range(len(history) - 4, len(history)))
-                selected_messages = [history[i] for i in selected_indices]
-            
-            # Filter out images and include only messages with remaining parts
-            new_history = [msg for msg in (filter_images(m) for m in selected_messages) if msg]
-
-        # Update the original history
-        history = new_history
+
+    try:
+        # The entire conversation history goes out; LLMClient retries, falls back or hedges as configured
+        answer = _gemini_llm.complete(request)
 
     except Exception as e:
+        _gemini_call_failed(history, e)
+        raise e # Re-raise the exception after logging it
+
+    return answer, _gemini_next_history(history, answer)
+
+
+def _gemini_call_failed(history, e=None):
+    if e is not None:
         print(f"Error calling Gemini API: {e}")
         # Print more specific error details if available from the API response
         if hasattr(e, 'response') and hasattr(e.response, 'text'):
              print(f"Gemini API error response text: {e.response.text}")
-        # If the API call fails, it's good practice to remove the last user message
-        # from history so that subsequent retries don't send the same failing message.
-        if history and history[-1]["role"] == "user":
-            history.pop() 
-        raise e # Re-raise the exception after logging it
+    # If the API call fails, it's good practice to remove the last user message
+    # from history so that subsequent retries don't send the same failing message.
+    if history and history[-1]["role"] == "user":
+        history.pop()
+
+
+def _gemini_next_history(history, answer):
+    """
+    History for the next turn: the first message plus the last 4, with
+    images dropped, followed by the model's `answer`.
+    """
+    new_history = []
+
+    # Process the history if it's not empty
+    if history:
+        if len(history) <= 3:
+            selected_messages = history
+        else:
+            selected_indices = [0] + list(range(len(history) - 4, len(history)))
+            selected_messages = [history[i] for i in selected_indices]
+        
+        # Filter out images and include only messages with remaining parts
+        new_history = [msg for msg in (filter_images(m) for m in selected_messages) if msg]
 
     # Append the model's response to the history for subsequent turns
     model_response_message_for_gemini = {
         "role": "model",
         "parts": [{"text": answer}]
     }
-    history.append(model_response_message_for_gemini)
-
-    return answer, history
\ No newline at end of file
+    new_history.append(model_response_message_for_gemini)
+    return new_history
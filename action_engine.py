@@ -0,0 +1,265 @@
+import os
+import time
+from collections import namedtuple
+from typing import Dict, List
+
+import pyautogui
+
+from GUI_functions import click_sequence, type_text, wait_for_screen_stable, BatchClickResolver
+
+# Merge redundant neighbours before running them: adjacent writes become one
+# write, and a write followed by pressing enter becomes one write that submits.
+ACTION_MERGE = os.getenv("ACTION_MERGE", "1") == "1"
+CLICK_POLL_INTERVAL = 0.25   # seconds between lookups while waiting for a click target
+SUBMIT_KEYS = ("enter", "return")
+
+# done: an "end" action ran; executed: the original actions that ran, in
+# order; failure: ActionFailure of the action that stopped the run, or None.
+RunResult = namedtuple("RunResult", ["done", "executed", "failure"])
+ActionFailure = namedtuple("ActionFailure", ["action", "reason"])
+
+
+class ActionFailed(Exception):
+    """Raised by a handler when its action can't be carried out."""
+
+
+def click_target(action: Dict) -> str:
+    """The text a click action looks for (its first 3 words)."""
+    return ' '.join(action["text"].split()[:3])
+
+
+def failure_prompt(failure: ActionFailure) -> str:
+    """What the model is told about a failed action on its next call."""
+    action = failure.action
+    if action['operation_type'] == "click":
+        return (f"Clicking onto {action['text']} failed. Try another method or another text. "
+                f"Everything that was after clicking aborded")
+    return (f"The {action['operation_type']} action {action} failed ({failure.reason}). "
+            f"Everything after it was aborted")
+
+
+class ActionHandler:
+    """
+    Runs one operation_type. `resolve()` finds what the action acts on (e.g.
+    the coordinates of a click), `execute()` performs it; either raises
+    ActionFailed. `settle_op()` names the SETTLE_TIMEOUTS entry to wait for
+    afterwards, or None to not wait.
+    """
+
+    def reset(self):
+        """Called at the start of every ActionEngine.run()."""
+
+    def resolve(self, action: Dict):
+        return None
+
+    def execute(self, action: Dict, target):
+        raise NotImplementedError
+
+    def settle_op(self, action: Dict):
+        return action['operation_type']
+
+
+class PressHandler(ActionHandler):
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+
+    def execute(self, action, target):
+        click_sequence(action["keys"], interval=self.interval)
+
+
+class WriteHandler(ActionHandler):
+    def __init__(self, debug: bool = True):
+        self.debug = debug
+
+    def execute(self, action, target):
+        type_text(action["content"], action.get("strategy"), debug=self.debug)
+        if action.get("submit"):
+            click_sequence(["enter"])
+
+    def settle_op(self, action):
+        # a submitted field may load a new page, so wait as long as for a key press
+        return "press" if action.get("submit") else "write"
+
+
+class ClickHandler(ActionHandler):
+    """
+    Clicks the on-screen text of a click action through a BatchClickResolver,
+    so all clicks of a run on an unchanged screen share one OCR pass.
+    With `wait` > 0 the target is polled for up to `wait` seconds.
+    """
+
+    def __init__(self, texts=(), wait: float = 0.0, debug: bool = True):
+        self.texts = list(texts)
+        self.wait = wait
+        self.debug = debug
+        self.resolver = None
+
+    def reset(self):
+        self.resolver = BatchClickResolver(self.texts, debug=self.debug)
+
+    def resolve(self, action):
+        text = click_target(action)
+        deadline = time.time() + self.wait
+        while True:
+            coords = self.resolver.locate(text)
+            if coords is not None:
+                return coords
+            if time.time() >= deadline:
+                raise ActionFailed(f"'{text}' not found on screen")
+            time.sleep(CLICK_POLL_INTERVAL)
+
+    def execute(self, action, target):
+        pyautogui.click(*target)
+
+
+class EndHandler(ActionHandler):
+    def execute(self, action, target):
+        print("Operation Done")
+
+    def settle_op(self, action):
+        return None
+
+
+def merge_actions(first: Dict, second: Dict):
+    """
+    One action doing what `first` then `second` do, or None if they can't
+    be merged. The originals are kept under "parts".
+    """
+    if first['operation_type'] != "write" or first.get("submit"):
+        return None
+    parts = first.get("parts", [first]) + [second]
+    if second['operation_type'] == "write" and second.get("strategy") == first.get("strategy"):
+        return dict(first, content=first["content"] + second["content"], parts=parts)
+    keys = second.get("keys") or []
+    if second['operation_type'] == "press" and len(keys) == 1 and keys[0].lower() in SUBMIT_KEYS:
+        return dict(first, submit=True, parts=parts)
+    return None
+
+
+class ActionEngine:
+    """
+    Executes action lists from the model, a plan cache or a recording
+    through one handler per operation_type.
+
+    Every action is resolved, executed and then given time to settle (see
+    wait_for_screen_stable); the three durations and any failure reason are
+    kept in `records` for the last run and summed per operation over all
+    runs in `stats`. A run stops at the first failed action or at "end".
+
+    With `merge`, a write is held back until the next action arrives so that
+    adjacent writes, or a write and an enter press, run as a single write.
+
+    Usage:
+        engine = ActionEngine()
+        result = engine.run(actions)
+    """
+
+    def __init__(self, handlers: Dict[str, ActionHandler] = None, merge: bool = ACTION_MERGE,
+                 settle: bool = True, debug: bool = True):
+        self.handlers = {
+            "press": PressHandler(),
+            "write": WriteHandler(debug),
+            "click": ClickHandler(debug=debug),
+            "end": EndHandler(),
+        }
+        self.handlers.update(handlers or {})
+        self.merge = merge
+        self.settle = settle
+        self.debug = debug
+        self.records: List[Dict] = []
+        self.stats: Dict[str, Dict] = {}
+        self.executed: List[Dict] = []
+        self.done = False
+        self.failure = None
+
+    def register(self, op: str, handler: ActionHandler):
+        self.handlers[op] = handler
+
+    def run(self, actions) -> RunResult:
+        """
+        Executes `actions` (any iterable, e.g. a stream of parsed actions).
+        Errors raised while iterating propagate; `executed` then still holds
+        what ran before.
+        """
+        self.records = []
+        self.executed = []
+        self.done = False
+        self.failure = None
+        for handler in self.handlers.values():
+            handler.reset()
+
+        pending = None
+        for action in actions:
+            if pending is not None:
+                merged = merge_actions(pending, action)
+                if merged is not None:
+                    pending = merged
+                    continue
+                if not self._step(pending):
+                    return self._result()
+                pending = None
+            if self.merge and action['operation_type'] == "write":
+                pending = action
+                continue
+            if not self._step(action) or self.done:
+                return self._result()
+        if pending is not None:
+            self._step(pending)
+        return self._result()
+
+    def _result(self) -> RunResult:
+        return RunResult(self.done, list(self.executed), self.failure)
+
+    def _step(self, action: Dict) -> bool:
+        """Runs one action. Returns False if it failed."""
+        op = action['operation_type']
+        parts = action.get("parts", [action])
+        if self.debug:
+            print(action if len(parts) == 1 else f"[ACTION] {len(parts)} actions merged into {action}")
+        record = {"op": op, "resolve": 0.0, "execute": 0.0, "settle": 0.0, "ok": True, "reason": None}
+        self.records.append(record)
+
+        handler = self.handlers.get(op)
+        try:
+            if handler is None:
+                raise ActionFailed(f"no handler for operation_type '{op}'")
+            start = time.perf_counter()
+            target = handler.resolve(action)
+            resolved = time.perf_counter()
+            handler.execute(action, target)
+            record["resolve"] = resolved - start
+            record["execute"] = time.perf_counter() - resolved
+        except ActionFailed as e:
+            record["ok"], record["reason"] = False, str(e)
+            self.failure = ActionFailure(action, str(e))
+            print(f"[ACTION] {op} failed: {e}")
+            self._count(record)
+            return False
+
+        self.executed += parts
+        if op == "end":
+            self.done = True
+        settle_op = handler.settle_op(action) if self.settle else None
+        if settle_op is not None:
+            record["settle"] = wait_for_screen_stable(op=settle_op, debug=False)
+        self._count(record)
+        if self.debug:
+            print(f"[ACTION] {op}: resolve {record['resolve'] * 1000:.0f} ms, "
+                  f"execute {record['execute'] * 1000:.0f} ms, settle {record['settle'] * 1000:.0f} ms")
+        return True
+
+    def _count(self, record: Dict):
+        stats = self.stats.setdefault(record["op"], {"count": 0, "failed": 0, "resolve": 0.0,
+                                                     "execute": 0.0, "settle": 0.0})
+        stats["count"] += 1
+        stats["failed"] += not record["ok"]
+        for phase in ("resolve", "execute", "settle"):
+            stats[phase] += record[phase]
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{op} x{s['count']} ({s['failed']} failed) resolve={s['resolve']:.1f}s "
+            f"execute={s['execute']:.1f}s settle={s['settle']:.1f}s"
+            for op, s in self.stats.items()
+        )
+
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import time
+import tracemalloc
+
+from PIL import Image
+
+import GUI_functions
+from GUI_functions import (
+    click_one_word_ocr,
+    click_multi_words_ocr,
+    click_easyocr_one_word,
+    click_easyocr_multi_words,
+    get_screen_capture,
+    reset_ocr_state,
+)
+
+DEFAULT_CORPUS = os.path.join("benchmarks", "ocr_corpus", "ground_truth.json")
+
+# name -> (one-word function, multi-word function, call kwargs, GUI_functions settings)
+CONFIGS = {
+    "tesseract": (click_one_word_ocr, click_multi_words_ocr, {}, {}),
+    "tesseract-untiled": (click_one_word_ocr, click_multi_words_ocr, {}, {"TESSERACT_TILED": False}),
+    "tesseract-2res": (click_one_word_ocr, click_multi_words_ocr, {"downscale": 2}, {}),
+    "easyocr": (click_easyocr_one_word, click_easyocr_multi_words, {}, {}),
+    "easyocr-2res": (click_easyocr_one_word, click_easyocr_multi_words, {"downscale": 2}, {}),
+    "onnx": (click_easyocr_one_word, click_easyocr_multi_words, {}, {"OCR_BACKEND": "onnx"}),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the OCR click path on stored screenshots")
+    parser.add_argument("--corpus", type=str, default=DEFAULT_CORPUS,
+                        help="ground_truth.json listing image, text, box [l, t, w, h] and kind")
+    parser.add_argument("--configs", nargs="*", default=list(CONFIGS), choices=list(CONFIGS),
+                        help="Backends/configurations to run")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per case")
+    parser.add_argument("--warm", action="store_true",
+                        help="Keep OCR caches between runs instead of measuring cold lookups")
+    parser.add_argument("--json", type=str, default=None, help="Also write the report to this file")
+    return parser.parse_args()
+
+
+def load_corpus(path: str):
+    """Cases from a ground-truth file; image paths are relative to it."""
+    with open(path, encoding="utf-8") as f:
+        cases = json.load(f)
+    root = os.path.dirname(os.path.abspath(path))
+    for case in cases:
+        case["image"] = os.path.normpath(os.path.join(root, case["image"]))
+    return cases
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def is_hit(result, box) -> bool:
+    """A dry-run result is a hit when its click point falls inside `box`."""
+    if not isinstance(result, tuple):
+        return False
+    x, y = result
+    l, t, w, h = box
+    return l <= x <= l + w and t <= y <= t + h
+
+
+def _run_cases(cases, images, one_word, multi_words, kwargs, repeats: int, warm: bool, on_result):
+    """
+    Runs every case `repeats` times on its stored screenshot. `on_result(case,
+    call)` wraps each lookup; `call()` performs it and returns its result.
+    """
+    capture = get_screen_capture()
+    reset_ocr_state()
+    for case in cases:
+        if case["image"] not in images:
+            images[case["image"]] = Image.open(case["image"]).convert("RGB")
+        capture.set_static_frame(images[case["image"]])
+        fn = multi_words if case.get("kind") == "multi_words" else one_word
+        for _ in range(repeats):
+            if not warm:
+                reset_ocr_state()
+            on_result(case, lambda: fn(case["text"], debug=False, dry_run=True, **kwargs))
+
+
+def run_config(name: str, cases, repeats: int = 3, warm: bool = False):
+    """
+    Latency and hit rate come from a pass without allocation tracing, which
+    would slow Python-heavy paths more than C-heavy ones; peak memory from a
+    separate traced pass that runs each case once.
+    """
+    one_word, multi_words, kwargs, settings = CONFIGS[name]
+    previous = {key: getattr(GUI_functions, key) for key in settings}
+    for key, value in settings.items():
+        setattr(GUI_functions, key, value)
+
+    images = {}
+    latencies, peaks = [], []
+    counts = {"hits": 0, "runs": 0}
+
+    def timed(case, call):
+        start = time.perf_counter()
+        result = call()
+        latencies.append(time.perf_counter() - start)
+        counts["hits"] += is_hit(result, case["box"])
+        counts["runs"] += 1
+
+    def traced(case, call):
+        tracemalloc.start()
+        try:
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+
+    try:
+        if one_word is click_easyocr_one_word:
+            GUI_functions.get_ocr_engine()  # keep model loading out of the timings
+        _run_cases(cases, images, one_word, multi_words, kwargs, repeats, warm, timed)
+        _run_cases(cases, images, one_word, multi_words, kwargs, 1, warm, traced)
+    finally:
+        get_screen_capture().set_static_frame(None)
+        for key, value in previous.items():
+            setattr(GUI_functions, key, value)
+
+    runs = counts["runs"]
+    return {
+        "config": name,
+        "runs": runs,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "peak_mb": max(peaks, default=0) / 2 ** 20,
+        "hit_rate": counts["hits"] / runs if runs else 0.0,
+    }
+
+
+def main():
+    args = parse_args()
+    cases = load_corpus(args.corpus)
+    print(f"{len(cases)} cases from {args.corpus}, {args.repeats} run(s) each, "
+          f"{'warm' if args.warm else 'cold'} caches")
+
+    report = []
+    for name in args.configs:
+        try:
+            report.append(run_config(name, cases, args.repeats, args.warm))
+        except Exception as e:
+            print(f"[{name}] skipped: {e}")
+
+    print(f"{'config':20} {'runs':>5} {'p50 ms':>9} {'p95 ms':>9} {'peak MB':>8} {'hit rate':>9}")
+    for row in report:
+        print(f"{row['config']:20} {row['runs']:5d} {row['p50_ms']:9.0f} {row['p95_ms']:9.0f} "
+              f"{row['peak_mb']:8.1f} {row['hit_rate']:9.1%}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,4 @@
-
-
-
-
-
-
-
-
+import json
 
 
 def clean_json(content):
@@ -26,4 +19,272 @@ def clean_json(content):
 
     content = "\n".join(line.strip() for line in content.splitlines())
 
-    return content
\ No newline at end of file
+    return content
+
+
+# The four operations the model may return and the fields each one needs.
+ACTION_SCHEMA = {
+    "click": ("text",),
+    "write": ("content",),
+    "press": ("keys",),
+    "end": (),
+}
+
+# The first-turn prompt asks for "done" instead of "end"; accept both.
+ACTION_ALIASES = {"done": "end"}
+
+# How model answers were parsed: as is, after local repair, or not at all,
+# and how many times the model had to be asked again.
+PARSE_STATS = {"parsed": 0, "repaired": 0, "failed": 0, "retries": 0}
+
+
+class ActionParseError(ValueError):
+    """The model answer is not a valid action list, even after repair."""
+
+
+def _next_char(content: str, i: int) -> str:
+    """First non-whitespace character at or after `i` ("" at the end)."""
+    while i < len(content) and content[i].isspace():
+        i += 1
+    return content[i] if i < len(content) else ""
+
+
+def _value_follows(content: str, i: int) -> bool:
+    nxt = _next_char(content, i)
+    return nxt != "" and nxt in "{[\"'"
+
+
+def repair_json(content: str) -> str:
+    """
+    Best-effort fix of the JSON defects LLMs commonly produce:
+
+    - code fences and prose around the array/object are dropped;
+    - single-quoted strings become double-quoted;
+    - trailing commas before `]` / `}` are removed;
+    - missing commas between values (e.g. `} {`) are inserted;
+    - Python literals True/False/None become true/false/null;
+    - an answer cut off mid-way keeps its complete actions and gets its
+      open brackets closed.
+
+    The result may still not be valid JSON.
+    """
+    content = clean_json(content.strip())
+    content = content.replace("“", '"').replace("”", '"')
+    content = content.replace("‘", "'").replace("’", "'")
+
+    starts = [i for i in (content.find("["), content.find("{")) if i != -1]
+    if starts:
+        content = content[min(starts):]
+
+    out = []
+    stack = []            # open brackets, to close a truncated answer
+    quote = None          # quote character of the string being copied
+    i = 0
+    while i < len(content):
+        ch = content[i]
+        if quote is not None:
+            if ch == "\\" and i + 1 < len(content):
+                nxt = content[i + 1]
+                # \' is not a JSON escape
+                out.append(nxt if nxt == "'" else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                quote = None
+                out.append('"')
+                if _value_follows(content, i + 1):
+                    out.append(",")
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "[{":
+            stack.append("]" if ch == "[" else "}")
+            out.append(ch)
+        elif ch in "]}":
+            out.append(ch)
+            if stack:
+                stack.pop()
+                if not stack:
+                    # the first top-level value is complete: drop whatever follows
+                    break
+            if _value_follows(content, i + 1):
+                out.append(",")
+        elif ch == ",":
+            if _next_char(content, i + 1) not in ("]", "}"):
+                out.append(ch)
+        elif ch.isalnum() or ch in "-.":
+            j = i
+            while j < len(content) and (content[j].isalnum() or content[j] in "-+._"):
+                j += 1
+            word = content[i:j]
+            out.append({"True": "true", "False": "false", "None": "null"}.get(word, word))
+            if _value_follows(content, j):
+                out.append(",")
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote is not None:
+        out.append('"')
+    out.extend(reversed(stack))
+    return "".join(out)
+
+
+def validate_action(action) -> dict:
+    """
+    Checks one action against ACTION_SCHEMA and returns it normalized
+    (lower-case operation_type, "done" -> "end", `keys` as a list of str).
+    Raises ActionParseError if it can't be executed.
+    """
+    if not isinstance(action, dict):
+        raise ActionParseError(f"action is not an object: {action!r}")
+    op = str(action.get("operation_type", "")).strip().lower()
+    op = ACTION_ALIASES.get(op, op)
+    if op not in ACTION_SCHEMA:
+        raise ActionParseError(f"unknown operation_type {action.get('operation_type')!r}")
+    missing = [field for field in ACTION_SCHEMA[op] if action.get(field) in (None, "", [])]
+    if missing:
+        raise ActionParseError(f"{op} action without {', '.join(missing)}: {action!r}")
+
+    action = dict(action, operation_type=op)
+    if op == "press":
+        keys = action["keys"]
+        action["keys"] = [str(k) for k in (keys if isinstance(keys, list) else [keys])]
+    elif op in ("click", "write"):
+        field = ACTION_SCHEMA[op][0]
+        action[field] = str(action[field])
+    return action
+
+
+def _load_json(content: str):
+    """json.loads, falling back to repair_json. Returns (value, repaired)."""
+    try:
+        return json.loads(clean_json(content)), False
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair_json(content)), True
+    except ValueError as e:
+        raise ActionParseError(f"could not repair model answer: {e}") from e
+
+
+def parse_actions(answer: str) -> list:
+    """
+    Parses and validates a whole model answer into a list of actions,
+    repairing it locally when needed. Raises ActionParseError only when the
+    answer can't be used and the model has to be asked again.
+    """
+    try:
+        data, repaired = _load_json(answer)
+        actions = [validate_action(a) for a in (data if isinstance(data, list) else [data])]
+        if not actions:
+            raise ActionParseError("model answer has no actions")
+    except ActionParseError:
+        PARSE_STATS["failed"] += 1
+        raise
+    PARSE_STATS["repaired" if repaired else "parsed"] += 1
+    if repaired:
+        print("[PARSE] repaired malformed action JSON locally")
+    return actions
+
+
+class ActionStreamParser:
+    """
+    Incremental parser for the model's `[{...}, {...}]` action array.
+
+    Feed it text chunks as they stream in; every action object is returned
+    as soon as its closing brace arrives, so it can be executed while the
+    rest of the plan is still being generated. Code fences or prose around
+    the array are skipped, a bare `{...}` object is accepted too, and each
+    object goes through repair_json / validate_action like parse_actions.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._top = None        # "[" or "{" once the JSON value has started
+        self._quote = None      # quote character while inside a string
+        self._escape = False
+        self._start = None      # offset of the action object being read
+        self.count = 0
+        self.repaired = False
+
+    def feed(self, chunk: str) -> list:
+        """Adds `chunk` and returns the action objects it completed."""
+        self.text += chunk
+        actions = []
+        while self._pos < len(self.text) and not self.finished:
+            ch = self.text[self._pos]
+            if self._quote is not None:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == self._quote:
+                    self._quote = None
+            elif self._top is None:
+                if ch in "[{":
+                    self._top = ch
+                    if ch == "{":
+                        self._start = self._pos
+                    self._depth = 1
+            elif ch in "\"'":
+                self._quote = ch
+            elif ch in "[{":
+                if ch == "{" and self._depth == 1 and self._top == "[":
+                    self._start = self._pos
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                object_depth = 1 if self._top == "[" else 0
+                if ch == "}" and self._depth == object_depth and self._start is not None:
+                    action, repaired = _load_json(self.text[self._start:self._pos + 1])
+                    self.repaired = self.repaired or repaired
+                    self._start = None
+                    self.count += 1
+                    actions.append(validate_action(action))
+            self._pos += 1
+        return actions
+
+    @property
+    def finished(self) -> bool:
+        """True once the top-level array/object has been closed."""
+        return self._top is not None and self._depth == 0
+
+
+def iter_actions(chunks):
+    """
+    Yields validated action dicts from a stream of text chunks as each one
+    completes.
+
+    If the stream ends without a single complete action, the whole text goes
+    through parse_actions. Raises ActionParseError when the answer can't be
+    used even after repair, so the caller can re-ask the model.
+    """
+    parser = ActionStreamParser()
+    try:
+        for chunk in chunks:
+            for action in parser.feed(chunk):
+                yield action
+    except ActionParseError:
+        PARSE_STATS["failed"] += 1
+        raise
+    if parser.count == 0:
+        for action in parse_actions(parser.text):
+            yield action
+        return
+    PARSE_STATS["repaired" if parser.repaired else "parsed"] += 1
+    if parser.repaired:
+        print("[PARSE] repaired malformed action JSON locally")
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+# Record/replay of LLM calls for deterministic, network-free runs:
+#   LLM_CASSETTE=record  - call the providers and append every call to the file
+#   LLM_CASSETTE=replay  - serve recorded answers, never touching the network
+#   LLM_CASSETTE=off     - (default) pass through
+# LLM_CASSETTE_LATENCY=1 makes replay wait as long as the recorded call took.
+# LLM_CASSETTE_IN_ORDER=1 lets a call whose prompt has no exact recording take
+# the next unused recording of its scope instead of failing.
+LLM_CASSETTE = os.getenv("LLM_CASSETTE", "off").lower()
+LLM_CASSETTE_FILE = os.getenv("LLM_CASSETTE_FILE", "llm_cassette.jsonl")
+LLM_CASSETTE_LATENCY = os.getenv("LLM_CASSETTE_LATENCY", "0") == "1"
+LLM_CASSETTE_IN_ORDER = os.getenv("LLM_CASSETTE_IN_ORDER", "0") == "1"
+
+REPLAY_CHUNK = 32   # characters per replayed stream chunk
+
+
+class CassetteMiss(Exception):
+    """Replay mode found no recorded answer for a call."""
+
+
+def _canonical(obj):
+    """JSON-able copy of a request with images replaced by a placeholder."""
+    if isinstance(obj, bytes):
+        return "<image>"
+    if isinstance(obj, str):
+        return "<image>" if obj.startswith("data:image") else obj
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(v) for v in obj]
+    if hasattr(obj, "__dict__"):
+        return _canonical(vars(obj))
+    return obj
+
+
+def request_fingerprint(scope: str, payload) -> str:
+    """
+    Hash of a call's scope and request text. Screenshots are left out: they
+    never repeat exactly, while the prompts of a repeated run do.
+    """
+    text = json.dumps([scope, _canonical(payload)], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    JSONL recording of LLM calls: scope ("gemini", "openai",
+    "code_executor"), request fingerprint, response text, latency and time
+    to first token.
+
+    On replay a call gets the first unused recording of its scope with the
+    same fingerprint; without one it raises CassetteMiss, or with `in_order`
+    takes the next unused recording of that scope, so a rerun whose prompts
+    drift slightly still gets the session's answers. `hits` counts exact
+    matches, `misses` calls without one.
+    """
+
+    def __init__(self, path: str = LLM_CASSETTE_FILE, mode: str = LLM_CASSETTE,
+                 replay_latency: bool = LLM_CASSETTE_LATENCY, in_order: bool = LLM_CASSETTE_IN_ORDER):
+        if mode not in ("off", "record", "replay"):
+            raise Exception(f"LLM_CASSETTE must be off, record or replay, not {mode!r}")
+        self.path = path
+        self.mode = mode
+        self.replay_latency = replay_latency
+        self.in_order = in_order
+        self._lock = threading.Lock()
+        self._entries = {}   # scope -> recorded calls, in order
+        self._used = set()
+        self.hits = 0
+        self.misses = 0
+        if mode == "replay":
+            self.load()
+
+    @property
+    def active(self) -> bool:
+        return self.mode != "off"
+
+    def load(self):
+        self._entries = {}
+        self._used = set()
+        if not os.path.exists(self.path):
+            logging.warning(f"Cassette {self.path} not found; every call will miss")
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    entry = json.loads(line)
+                    self._entries.setdefault(entry["scope"], []).append(entry)
+                except (ValueError, KeyError):
+                    logging.warning(f"Skipping malformed cassette line {line_no}")
+
+    def _take(self, scope: str, fingerprint: str) -> dict:
+        with self._lock:
+            entries = self._entries.get(scope, [])
+            unused = [e for e in entries if id(e) not in self._used]
+            match = next((e for e in unused if e["fingerprint"] == fingerprint), None)
+            if match is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                if not self.in_order or not unused:
+                    raise CassetteMiss(f"no recorded {scope} answer for this request in {self.path}")
+                match = unused[0]
+                print(f"[CASSETTE] no exact {scope} recording, using the next one in order")
+            self._used.add(id(match))
+            return match
+
+    def _append(self, entry: dict):
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _replay(self, entry: dict):
+        text = entry["response"]
+        chunks = [text[i:i + REPLAY_CHUNK] for i in range(0, len(text), REPLAY_CHUNK)] or [""]
+        if self.replay_latency:
+            time.sleep(entry.get("ttft") or 0)
+            rest = max(0.0, entry.get("latency", 0) - (entry.get("ttft") or 0)) / len(chunks)
+        for chunk in chunks:
+            yield chunk
+            if self.replay_latency:
+                time.sleep(rest)
+
+    def stream(self, scope: str, payload, live):
+        """
+        Text chunks for a call. `live()` returns the provider's chunk
+        iterator and is only called when not replaying.
+        """
+        fingerprint = request_fingerprint(scope, payload)
+        if self.mode == "replay":
+            yield from self._replay(self._take(scope, fingerprint))
+            return
+        if self.mode == "off":
+            yield from live()
+            return
+
+        started = time.perf_counter()
+        ttft = None
+        parts = []
+        for chunk in live():
+            if chunk and ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(chunk or "")
+            yield chunk
+        self._append({
+            "scope": scope,
+            "fingerprint": fingerprint,
+            "response": "".join(parts),
+            "latency": time.perf_counter() - started,
+            "ttft": ttft,
+            "recorded": time.time(),
+        })
+
+    def complete(self, scope: str, payload, live) -> str:
+        """Whole answer of a call. `live()` returns the provider's text."""
+        return "".join(self.stream(scope, payload, lambda: iter([live()])))
+
+
+CASSETTE = Cassette()
@@ -0,0 +1,506 @@
+import os
+import json
+import time
+import queue
+import random
+import base64
+import logging
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from prompt_cache import openai_usage, gemini_usage, record_usage
+from llm_cassette import CASSETTE
+
+# OpenAI model: the one ask_gpt4o called before this client layer existed.
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4.1-mini-2025-04-14")
+
+# Per-request network timeout, total deadline of one LLM call (all retries,
+# hedges and the streamed answer included), retries per provider and the
+# first backoff delay (doubled on every retry, with jitter).
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "90"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF = float(os.getenv("LLM_BACKOFF", "0.5"))
+
+# Fall back to the other provider when the first one fails for good.
+LLM_FALLBACK = os.getenv("LLM_FALLBACK", "1") == "1"
+# Hedging: also ask the other provider when the first one has not produced
+# its first token after the LLM_HEDGE_PERCENTILE of its recent latencies
+# (LLM_HEDGE_DELAY seconds until there are enough samples).
+LLM_HEDGE = os.getenv("LLM_HEDGE", "0") == "1"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9"))
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "6"))
+LLM_HEDGE_MIN_SAMPLES = 5
+
+# Connection pool shared by the HTTP clients.
+LLM_POOL_LIMITS = httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=60)
+
+# Counters of the client layer, for monitoring.
+CLIENT_STATS = {"calls": 0, "retries": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+RETRYABLE_STATUS = {408, 409, 429}
+RETRYABLE_ERRORS = {
+    "APIConnectionError", "APITimeoutError", "TimeoutException", "ConnectError", "ReadTimeout",
+    "RemoteProtocolError", "ServiceUnavailable", "DeadlineExceeded", "ResourceExhausted",
+    "InternalServerError", "TooManyRequests",
+}
+
+
+class LLMError(Exception):
+    """No provider produced an answer within the deadline."""
+
+
+def is_retryable(e: Exception) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx are worth retrying."""
+    status = getattr(e, "status_code", None)
+    if not isinstance(status, int):
+        status = getattr(e, "code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS or status >= 500
+    if isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    return type(e).__name__ in RETRYABLE_ERRORS
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = (len(values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+# ---- request formats -----------------------------------------------------
+
+class LLMRequest:
+    """
+    One model call, in the format of the conversation it came from: Gemini
+    `contents` (dicts with "role"/"parts") or OpenAI `messages`. Each
+    provider converts it to its own format, so the call can be retried,
+    hedged or fall back across providers.
+    """
+
+    def __init__(self, gemini=None, openai=None, system: str = None, temperature: float = 0.7):
+        self.gemini = gemini
+        self.openai = openai
+        self.system = system
+        self.temperature = temperature
+
+    def openai_messages(self):
+        if self.openai is not None:
+            return self.openai
+        messages = [{"role": "system", "content": self.system}] if self.system else []
+        for message in self.gemini:
+            content = []
+            for part in message["parts"]:
+                if "text" in part:
+                    content.append({"type": "text", "text": part["text"]})
+                elif str(part.get("mime_type", "")).startswith("image/"):
+                    data = base64.b64encode(part["data"]).decode("utf-8")
+                    content.append({"type": "image_url",
+                                    "image_url": {"url": f"data:{part['mime_type']};base64,{data}"}})
+            role = "assistant" if message["role"] == "model" else "user"
+            if role == "assistant":
+                content = " ".join(p["text"] for p in content if p["type"] == "text")
+            messages.append({"role": role, "content": content})
+        return messages
+
+    def gemini_contents(self):
+        """Gemini contents; system messages are left to the model's system instruction."""
+        if self.gemini is not None:
+            return self.gemini
+        contents = []
+        for message in self.openai:
+            if message["role"] == "system":
+                continue
+            content = message["content"]
+            parts = []
+            for part in (content if isinstance(content, list) else [{"type": "text", "text": content}]):
+                if part["type"] == "text":
+                    parts.append({"text": part["text"]})
+                elif part["type"] == "image_url":
+                    header, data = part["image_url"]["url"].split(",", 1)
+                    parts.append({"mime_type": header[len("data:"):].split(";")[0],
+                                  "data": base64.b64decode(data)})
+            contents.append({"role": "model" if message["role"] == "assistant" else "user", "parts": parts})
+        return contents
+
+
+# ---- providers -----------------------------------------------------------
+
+class Provider:
+    """A model endpoint that streams text for an LLMRequest."""
+
+    name = "provider"
+
+    def __init__(self):
+        self.latencies = deque(maxlen=50)   # seconds to first token of recent calls
+
+    def stream(self, request: LLMRequest, timeout: float):
+        raise NotImplementedError
+
+    def hedge_delay(self) -> float:
+        if len(self.latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DELAY
+        return percentile(self.latencies, LLM_HEDGE_PERCENTILE)
+
+
+class OpenAIProvider(Provider):
+    """
+    OpenAI chat completions over a pooled httpx client. `base_url` can point
+    at any OpenAI-compatible server, e.g. the stand-in from `serve_stub`.
+    """
+
+    name = "openai"
+
+    def __init__(self, model: str = OPENAI_MODEL, client=None, base_url: str = None,
+                 api_key: str = None):
+        super().__init__()
+        self.model = model
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(
+                api_key=api_key or os.getenv("OPENAI_API_KEY") or "missing",
+                base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+                http_client=httpx.Client(limits=LLM_POOL_LIMITS, timeout=LLM_TIMEOUT),
+                max_retries=0,   # retries are done by LLMClient
+            )
+        self.client = client
+
+    def stream(self, request: LLMRequest, timeout: float):
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=request.openai_messages(),
+            temperature=request.temperature,
+            stream=True,
+            timeout=timeout,
+            # the last chunk then carries the usage, including cached prompt tokens
+            extra_body={"stream_options": {"include_usage": True}},
+        )
+        for chunk in response:
+            if chunk.choices:
+                yield chunk.choices[0].delta.content
+            elif getattr(chunk, "usage", None) is not None:
+                record_usage("openai", *openai_usage(chunk.usage))
+
+
+class GeminiProvider(Provider):
+    """Gemini through the SDK; `model_factory` returns the (cached) model to use."""
+
+    name = "gemini"
+
+    def __init__(self, model_factory):
+        super().__init__()
+        self.model_factory = model_factory
+
+    def stream(self, request: LLMRequest, timeout: float):
+        import google.generativeai as genai
+
+        response = self.model_factory().generate_content(
+            request.gemini_contents(),
+            generation_config=genai.types.GenerationConfig(temperature=request.temperature),
+            stream=True,
+            request_options={"timeout": timeout},
+        )
+        for chunk in response:
+            try:
+                yield chunk.text
+            except ValueError:
+                continue   # chunk without text parts
+        # usage_metadata is complete once the stream is consumed
+        record_usage("gemini", *gemini_usage(getattr(response, "usage_metadata", None)))
+
+
+# ---- client --------------------------------------------------------------
+
+class _Attempt:
+    """One provider working on a request in a background thread."""
+
+    def __init__(self, provider: Provider, request: LLMRequest, events: queue.Queue,
+                 deadline: float, max_retries: int, backoff: float):
+        self.provider = provider
+        self.cancelled = threading.Event()
+        self.started = time.monotonic()
+        self._args = (request, events, deadline, max_retries, backoff)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        request, events, deadline, max_retries, backoff = self._args
+        for attempt in range(max_retries + 1):
+            first = True
+            try:
+                timeout = max(1.0, min(LLM_TIMEOUT, deadline - time.monotonic()))
+                for chunk in self.provider.stream(request, timeout):
+                    if self.cancelled.is_set():
+                        return
+                    if chunk:
+                        if first:
+                            self.provider.latencies.append(time.monotonic() - self.started)
+                            first = False
+                        events.put((self, "chunk", chunk))
+                events.put((self, "done", None))
+                return
+            except Exception as e:
+                # once text has been handed out the call can't be repeated
+                delay = backoff * 2 ** attempt * (1 + random.random() * 0.5)
+                retry = (first and attempt < max_retries and is_retryable(e)
+                         and time.monotonic() + delay < deadline and not self.cancelled.is_set())
+                if not retry:
+                    events.put((self, "error", e))
+                    return
+                CLIENT_STATS["retries"] += 1
+                print(f"[LLM] {self.provider.name} failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+class LLMClient:
+    """
+    Runs LLMRequests against a primary provider with:
+
+    - a total deadline per call;
+    - retries with exponential backoff on timeouts, connection errors,
+      rate limits and 5xx;
+    - fallback to the secondary provider when the primary fails for good;
+    - optional hedging: the secondary is also asked when the primary has
+      not answered within its recent latency percentile; the first one to
+      produce text wins and the other is abandoned.
+
+    `stream()` yields text chunks of the winning answer; `complete()`
+    returns the whole text. With a recording or replaying `cassette`, calls
+    are recorded under `scope` or served from the recording.
+    """
+
+    def __init__(self, primary: Provider, secondary: Provider = None, deadline: float = LLM_DEADLINE,
+                 max_retries: int = LLM_MAX_RETRIES, backoff: float = LLM_BACKOFF,
+                 fallback: bool = LLM_FALLBACK, hedge: bool = LLM_HEDGE,
+                 scope: str = None, cassette=CASSETTE):
+        self.scope = scope or primary.name
+        self.cassette = cassette
+        self.primary = primary
+        self.secondary = secondary
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.fallback = fallback and secondary is not None
+        self.hedge = hedge and secondary is not None
+
+    def stream(self, request: LLMRequest):
+        if self.cassette is not None and self.cassette.active:
+            return self.cassette.stream(self.scope, request, lambda: self._stream(request))
+        return self._stream(request)
+
+    def _stream(self, request: LLMRequest):
+        CLIENT_STATS["calls"] += 1
+        deadline = time.monotonic() + self.deadline
+        events = queue.Queue()
+        attempts = []
+
+        def start(provider):
+            attempts.append(_Attempt(provider, request, events, deadline, self.max_retries, self.backoff))
+
+        start(self.primary)
+        hedge_at = time.monotonic() + self.primary.hedge_delay() if self.hedge else None
+        errors = []
+        winner = None
+
+        while winner is None:
+            now = time.monotonic()
+            wait = deadline - now
+            if hedge_at is not None:
+                wait = min(wait, hedge_at - now)
+            if deadline - now <= 0:
+                self._cancel(attempts)
+                CLIENT_STATS["failures"] += 1
+                raise LLMError(f"no answer within {self.deadline:.0f}s")
+            try:
+                attempt, kind, payload = events.get(timeout=max(wait, 0.001))
+            except queue.Empty:
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    CLIENT_STATS["hedges"] += 1
+                    print(f"[LLM] {self.primary.name} slow, hedging with {self.secondary.name}")
+                    start(self.secondary)
+                continue
+
+            if kind == "error":
+                errors.append(payload)
+                print(f"[LLM] {attempt.provider.name} failed: {type(payload).__name__}: {payload}")
+                if self.fallback and len(attempts) == 1:
+                    hedge_at = None
+                    CLIENT_STATS["fallbacks"] += 1
+                    print(f"[LLM] falling back to {self.secondary.name}")
+                    start(self.secondary)
+                elif len(errors) == len(attempts):
+                    CLIENT_STATS["failures"] += 1
+                    raise LLMError(f"all providers failed: {errors[-1]}") from errors[-1]
+                continue
+
+            winner = attempt
+            if attempt.provider is not self.primary and hedge_at is None and len(errors) == 0:
+                CLIENT_STATS["hedge_wins"] += 1
+
+        self._cancel(a for a in attempts if a is not winner)
+        while True:
+            if kind == "chunk":
+                yield payload
+            elif kind == "done":
+                return
+            elif kind == "error":
+                raise payload
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                winner.cancelled.set()
+                CLIENT_STATS["failures"] += 1
+                raise LLMError(f"answer not finished within {self.deadline:.0f}s")
+            try:
+                attempt, kind, payload = events.get(timeout=remaining)
+            except queue.Empty:
+                kind = None   # nothing new: the deadline check above ends the wait
+                continue
+            if attempt is not winner:
+                kind = None   # late events of an abandoned attempt
+
+    def complete(self, request: LLMRequest) -> str:
+        return "".join(self.stream(request))
+
+    @staticmethod
+    def _cancel(attempts):
+        for attempt in attempts:
+            attempt.cancelled.set()
+
+
+# ---- local HTTP stand-in -------------------------------------------------
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """
+    OpenAI-compatible `/v1/chat/completions` (plain and SSE streaming) with
+    configurable latency and injected failures, for exercising LLMClient
+    without network access. Settings live on the server object.
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        with server.lock:
+            server.requests += 1
+            fail = server.requests <= server.fail_first
+        time.sleep(server.latency)
+        if fail:
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(b'{"error": {"message": "stub: injected failure"}}')
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        answer = server.answer
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(answer) // 4,
+                 "total_tokens": prompt_tokens + len(answer) // 4,
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+        base = {"id": "stub", "created": int(time.time()), "model": body.get("model", "stub")}
+
+        if not body.get("stream"):
+            payload = dict(base, object="chat.completion", usage=usage, choices=[{
+                "index": 0, "finish_reason": "stop",
+                "message": {"role": "assistant", "content": answer}}])
+            data = json.dumps(payload).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(0, len(answer), 16):
+            chunk = dict(base, object="chat.completion.chunk", choices=[{
+                "index": 0, "finish_reason": None, "delta": {"content": answer[i:i + 16]}}])
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(server.chunk_delay)
+        self.wfile.write(f"data: {json.dumps(dict(base, object='chat.completion.chunk', choices=[], usage=usage))}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def serve_stub(port: int = 0, latency: float = 0.0, fail_first: int = 0, chunk_delay: float = 0.01,
+               answer: str = '[{"thought": "stub", "operation_type": "end", "summary": "stub"}]'):
+    """Starts the stand-in server in a background thread. Returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.fail_first = fail_first
+    server.chunk_delay = chunk_delay
+    server.answer = answer
+    server.requests = 0
+    server.lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="LLM client layer: local stand-in server and checks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    serve = sub.add_parser("serve", help="Run the OpenAI-compatible stand-in server")
+    serve.add_argument("--port", type=int, default=8089)
+    serve.add_argument("--latency", type=float, default=0.0, help="Seconds before each response")
+    serve.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with 503")
+
+    sub.add_parser("check", help="Exercise retries, fallback and hedging against stand-in servers")
+    return parser.parse_args()
+
+
+def run_checks():
+    """Retries, fallback and hedging against local stand-ins; prints what happened."""
+    flaky, flaky_url = serve_stub(fail_first=2)
+    client = LLMClient(OpenAIProvider(base_url=flaky_url, api_key="stub"), max_retries=2, backoff=0.1)
+    print("retry:", client.complete(LLMRequest(openai=[{"role": "user", "content": "hi"}])), CLIENT_STATS)
+
+    down, down_url = serve_stub(fail_first=10 ** 6)
+    ok, ok_url = serve_stub()
+    client = LLMClient(OpenAIProvider(base_url=down_url, api_key="stub"),
+                       OpenAIProvider(base_url=ok_url, api_key="stub"), max_retries=1, backoff=0.1)
+    print("fallback:", client.complete(LLMRequest(openai=[{"role": "user", "content": "hi"}])), CLIENT_STATS)
+
+    slow, slow_url = serve_stub(latency=3.0)
+    fast, fast_url = serve_stub(latency=0.1)
+    primary = OpenAIProvider(base_url=slow_url, api_key="stub")
+    primary.latencies.extend([0.2] * LLM_HEDGE_MIN_SAMPLES)   # pretend it is usually fast
+    client = LLMClient(primary, OpenAIProvider(base_url=fast_url, api_key="stub"), hedge=True)
+    start = time.monotonic()
+    text = client.complete(LLMRequest(openai=[{"role": "user", "content": "hi"}]))
+    print(f"hedge: {text} in {time.monotonic() - start:.2f}s", CLIENT_STATS)
+
+
+def main():
+    args = parse_args()
+    if args.command == "serve":
+        server, url = serve_stub(args.port, args.latency, args.fail_first)
+        print(f"Stand-in LLM server at {url} (set OPENAI_BASE_URL to use it)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+    else:
+        run_checks()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
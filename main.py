@@ -1,21 +1,10 @@
-import time
-import json
-import pyautogui
 import speech_recognition as sr
 
-from GUI_functions import (
-    click_sequence,
-    click_coords,
-    click_text_image,
-    click_one_word_ocr,
-    click_multi_words_ocr,
-    click_easyocr_one_word,
-    click_easyocr_multi_words
-)
-
-from LLM_functions import ask_gpt4o, ask_gemini_flash
-
-from functions import clean_json
+from GUI_functions import warm_up_reader
+from plan_cache import PlanCache
+from trajectory import TrajectoryStore
+from action_engine import ActionEngine
+from objective import run_objective
 import os
 import openai
 from dotenv import load_dotenv
@@ -102,7 +91,12 @@ def get_voice_command():
             return ""
 
 def main():
+    # load the OCR models in the background while BERT and the prompt come up
+    warm_up_reader()
     executor = CodeExecutor()
+    plan_cache = PlanCache()
+    trajectories = TrajectoryStore()
+    engine = ActionEngine()
     tokenizer = BertTokenizerFast.from_pretrained('./model_output/checkpoint-95')
     model = BertForSequenceClassification.from_pretrained('./model_output/checkpoint-95')
 
@@ -140,57 +134,9 @@ def main():
         print(predictions)
         
         if predictions == 0:
-            done = False
             # aim="Open my main vault in obsidian app"
             aim = user_input
-            add_prompt = ""
-            history = []
-            while not done:
-
-                # answer, history = ask_gpt4o(aim, add_prompt, history=[])
-                
-                answer, history = ask_gemini_flash(aim, add_prompt, history=history)
-                
-                cleaned_answer = clean_json(answer)
-                try:
-                    answer = json.loads(cleaned_answer)
-                except:
-                    answer, history = ask_gemini_flash(aim, add_prompt, history=history)
-                    cleaned_answer = clean_json(answer)
-                    answer = json.loads(cleaned_answer)
-                    
-                print(answer)
-                for action in answer:
-                    # print(action)
-                    if action['operation_type'] == "press":
-                        click_sequence(action["keys"], interval=0.2)
-                        time.sleep(1)
-                        add_prompt = ""
-
-                    elif action['operation_type'] == "write":
-                        for char in action["content"]:
-                            pyautogui.write(char)
-                        time.sleep(1)
-                        add_prompt = ""
-
-                    elif action['operation_type'] == "click":
-                        if len(action["text"].split(" ")) == 1:
-                            # output = click_one_word_ocr((action["text"]))
-                            output = click_easyocr_one_word(action['text'])
-                        else:
-                            # output = click_multi_words_ocr(' '.join(action["text"].split()[:3]))
-                            output = click_easyocr_one_word(' '.join(action["text"].split()[:3]))
-                        if (output == True):
-                            time.sleep(1)
-                            add_prompt = ""
-                        else:
-                            add_prompt = f"Clicking onto {action['text']} failed. Try another method or another text. Everything that was after clicking aborded"
-                            break
-
-                    elif action['operation_type'] == "end":
-                        print("Operation Done")
-                        done = True
-                        break
+            run_objective(aim, engine, plan_cache, trajectories)
 
         elif predictions == 1:
             try:
@@ -0,0 +1,92 @@
+import json
+from typing import Dict, List
+
+from GUI_functions import SETTLE_STATS, TEXT_INPUT_STATS
+from LLM_functions import ask_gemini_flash
+from functions import iter_actions, ActionParseError, PARSE_STATS
+from plan_cache import PlanCache, screen_fingerprint
+from trajectory import TrajectoryStore, replay_trajectory
+from action_engine import ActionEngine, failure_prompt
+
+
+# click targets are resolved as they arrive; one OCR pass serves every click on an unchanged screen
+def run_objective(aim: str, engine: ActionEngine, plan_cache: PlanCache,
+                  trajectories: TrajectoryStore) -> List[Dict]:
+    """
+    Carries out `aim` until an "end" action runs and returns every action
+    that was executed for it.
+
+    A recorded run of the objective (TrajectoryStore) is replayed first; the
+    model takes over where it stops matching the screen. Each step is then
+    taken from the plan cache when the same screen was seen at that step
+    before, otherwise streamed from the model and run as it arrives. A step
+    whose answer can't be parsed is asked for once more.
+    """
+    add_prompt = ""
+    history = []
+    parse_failed = False
+    step = 0
+    replayed = []
+    trajectory = []  # every action of this run, recorded once the objective is done
+    # a completed run of this objective is replayed without the model first
+    replay = replay_trajectory(trajectories, aim)
+    trajectory += replay.executed
+    done = replay.done
+    if not done and (replay.executed or replay.diverged):
+        # carry on with the model from where the recording stopped matching the screen
+        replayed = list(replay.executed)
+        add_prompt = f"These actions were already executed: {json.dumps(replayed, ensure_ascii=False)}"
+        if replay.diverged is not None:
+            add_prompt += f" The next step was to click '{replay.diverged['expect']}', but it is not on the screen."
+    while not done:
+        fingerprint = screen_fingerprint()
+        cached = plan_cache.lookup(aim, step, fingerprint)
+        stream = None
+        if cached is not None:
+            # this objective reached this step on the same screen before: skip the model
+            print(f"[PLAN CACHE] step {step}: replaying {len(cached)} cached action(s)")
+            actions = iter(cached)
+        else:
+            # stream the answer and run each action as soon as the model has written it out
+            stream = ask_gemini_flash(aim, add_prompt, history=history, stream=True)
+            actions = iter_actions(stream)
+            replayed = []
+        failed = False
+        try:
+            engine.run(actions)
+        except ActionParseError as e:
+            # not even local repair could save the answer: ask once more, give up on a second failure
+            print(f"[PARSE] {e}")
+            if parse_failed:
+                raise
+            parse_failed = True
+            failed = True
+            PARSE_STATS["retries"] += 1
+        else:
+            parse_failed = False
+        executed = engine.executed
+        done = engine.done
+        if executed:
+            add_prompt = ""
+        if engine.failure is not None:
+            add_prompt = failure_prompt(engine.failure)
+            failed = True
+        if stream is not None:
+            answer, history = stream.finish()
+
+        trajectory += executed
+        if failed:
+            plan_cache.invalidate(aim, step, fingerprint)
+        else:
+            plan_cache.store(aim, step, fingerprint, executed)
+            step += 1
+            if cached is not None:
+                # the model did not see these steps; tell it on the next call
+                replayed += cached
+                add_prompt = f"These actions were already executed: {json.dumps(replayed, ensure_ascii=False)}"
+    trajectories.record(aim, trajectory)
+    print(f"[PARSE] {PARSE_STATS}, [PLAN CACHE] hits={plan_cache.hits} misses={plan_cache.misses}, "
+          f"[SETTLE] {SETTLE_STATS['waits']} waits, {SETTLE_STATS['total']:.1f}s, {SETTLE_STATS['timeouts']} timeouts, {SETTLE_STATS['unchanged']} unchanged, "
+          f"[INPUT] {TEXT_INPUT_STATS}")
+    print(f"[ACTION] {engine.summary()}")
+    return trajectory
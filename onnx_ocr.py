@@ -0,0 +1,384 @@
+"""
+Quantized ONNX CPU backend for the EasyOCR click path.
+
+The EasyOCR detector (CRAFT) and English recognizer (CRNN) are exported to
+ONNX once, int8-quantized, and then run under onnxruntime without PyTorch.
+Detection post-processing follows EasyOCR's (getDetBoxes, group_text_box
+with its margin and size filter), so `OnnxOCR.readtext` returns line-level
+(bbox, text, conf) results like `easyocr.Reader.readtext` and GUI_functions
+can swap it in with OCR_BACKEND=onnx. Only axis-aligned boxes are produced.
+
+    python onnx_ocr.py export                      # writes onnx_models/
+    python onnx_ocr.py compare screenshots/*.png   # accuracy/latency vs EasyOCR
+"""
+import argparse
+import glob
+import json
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+
+OCR_ONNX_DIR = os.getenv("OCR_ONNX_DIR", "onnx_models")
+
+DETECTOR_FILE = "craft_int8.onnx"
+RECOGNIZER_FILE = "english_g2_int8.onnx"
+CHARSET_FILE = "charset.json"
+
+# CRAFT settings, same defaults as easyocr.Reader.readtext
+CANVAS_SIZE = 2560
+TEXT_THRESHOLD = 0.7
+LOW_TEXT = 0.4
+LINK_THRESHOLD = 0.4
+
+# group_text_box settings, same defaults as easyocr.Reader.readtext
+YCENTER_THS = 0.5
+HEIGHT_THS = 0.5
+WIDTH_THS = 0.5
+ADD_MARGIN = 0.1
+MIN_SIZE = 20
+
+REC_HEIGHT = 64
+REC_MAX_WIDTH = 2048
+REC_BATCH_SIZE = 32
+
+
+def _session(path: str):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = os.cpu_count() or 4
+    return ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+
+class OnnxOCR:
+    """
+    EasyOCR-compatible reader running exported int8 models on the CPU.
+
+    Args:
+        model_dir (str): directory written by `export_easyocr_models`.
+        batch_size (int): crops recognized per recognizer call.
+    """
+
+    def __init__(self, model_dir: str = OCR_ONNX_DIR, batch_size: int = REC_BATCH_SIZE):
+        self.device = "onnx-cpu"
+        self.batch_size = batch_size
+        self.detector = _session(os.path.join(model_dir, DETECTOR_FILE))
+        self.recognizer = _session(os.path.join(model_dir, RECOGNIZER_FILE))
+        with open(os.path.join(model_dir, CHARSET_FILE), encoding="utf-8") as f:
+            self.characters = json.load(f)["characters"]
+
+    # ---- detection ------------------------------------------------------
+
+    def detect(self, img_gray: np.ndarray):
+        """Axis-aligned text boxes (l, t, r, b) in `img_gray` coordinates."""
+        h, w = img_gray.shape[:2]
+        ratio = min(1.0, CANVAS_SIZE / max(h, w))
+        th, tw = int(h * ratio), int(w * ratio)
+        resized = cv2.resize(img_gray, (tw, th), interpolation=cv2.INTER_LINEAR) if ratio < 1 else img_gray
+
+        # pad to a multiple of 32 like CRAFT expects
+        ph, pw = -(-th // 32) * 32, -(-tw // 32) * 32
+        canvas = np.zeros((ph, pw, 3), dtype=np.float32)
+        canvas[:th, :tw] = cv2.cvtColor(resized, cv2.COLOR_GRAY2RGB)
+        canvas -= np.array([0.485, 0.456, 0.406], dtype=np.float32) * 255.0
+        canvas /= np.array([0.229, 0.224, 0.225], dtype=np.float32) * 255.0
+        x = canvas.transpose(2, 0, 1)[None]
+
+        y = self.detector.run(None, {"image": x})[0][0]  # (H/2, W/2, 2)
+        textmap, linkmap = y[:, :, 0], y[:, :, 1]
+
+        scale = 2.0 / ratio  # score maps are half the input resolution
+        words = [(l * scale, t * scale, r * scale, b * scale)
+                 for l, t, r, b in _craft_boxes(textmap, linkmap)]
+        boxes = []
+        for l, t, r, b in group_text_boxes(words):
+            if max(r - l, b - t) <= MIN_SIZE:
+                continue
+            boxes.append((max(0, int(l)), max(0, int(t)), min(w, int(math.ceil(r))), min(h, int(math.ceil(b)))))
+        return boxes
+
+    # ---- recognition ----------------------------------------------------
+
+    def _decode(self, probs: np.ndarray):
+        """Greedy CTC decode of one (T, C) probability matrix."""
+        best = probs.argmax(axis=1)
+        chars, kept = [], []
+        prev = 0
+        for t, idx in enumerate(best):
+            if idx != 0 and idx != prev:
+                chars.append(self.characters[idx - 1])
+                kept.append(probs[t, idx])
+            prev = idx
+        if not kept:
+            return "", 0.0
+        kept = np.array(kept)
+        # EasyOCR's confidence: a length-normalized product of the char probabilities
+        return "".join(chars), float(kept.prod() ** (2.0 / math.sqrt(len(kept))))
+
+    def recognize(self, img_gray: np.ndarray, boxes):
+        """Reads every box, batched. Returns a (text, conf) per box."""
+        crops = []
+        for l, t, r, b in boxes:
+            crop = img_gray[t:b, l:r]
+            ch, cw = crop.shape[:2]
+            width = min(REC_MAX_WIDTH, max(REC_HEIGHT, int(math.ceil(REC_HEIGHT * cw / max(ch, 1)))))
+            crops.append(cv2.resize(crop, (width, REC_HEIGHT), interpolation=cv2.INTER_CUBIC))
+
+        results = [None] * len(crops)
+        # group similar widths into the same batch to keep padding small
+        order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1])
+        for start in range(0, len(order), self.batch_size):
+            idxs = order[start:start + self.batch_size]
+            width = max(crops[i].shape[1] for i in idxs)
+            batch = np.empty((len(idxs), 1, REC_HEIGHT, width), dtype=np.float32)
+            for row, i in enumerate(idxs):
+                crop = crops[i]
+                batch[row, 0, :, :crop.shape[1]] = crop
+                # pad by repeating the last column, as EasyOCR's NormalizePAD does
+                batch[row, 0, :, crop.shape[1]:] = crop[:, -1:]
+            batch = (batch / 255.0 - 0.5) / 0.5
+
+            logits = self.recognizer.run(None, {"image": batch})[0]  # (B, T, C)
+            logits = logits - logits.max(axis=2, keepdims=True)
+            probs = np.exp(logits)
+            probs /= probs.sum(axis=2, keepdims=True)
+            for row, i in enumerate(idxs):
+                results[i] = self._decode(probs[row])
+        return results
+
+    def readtext(self, img: np.ndarray):
+        """Line-level [(bbox, text, conf), ...] like easyocr.Reader.readtext."""
+        img_gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        boxes = self.detect(img_gray)
+        out = []
+        for (l, t, r, b), (text, conf) in zip(boxes, self.recognize(img_gray, boxes)):
+            if text:
+                out.append(([[l, t], [r, t], [r, b], [l, b]], text, conf))
+        return out
+
+
+def _craft_boxes(textmap: np.ndarray, linkmap: np.ndarray,
+                 text_threshold: float = TEXT_THRESHOLD, link_threshold: float = LINK_THRESHOLD,
+                 low_text: float = LOW_TEXT):
+    """
+    Word boxes of the CRAFT score maps as (l, t, r, b) in score map
+    coordinates (EasyOCR's getDetBoxes, with bounding boxes instead of
+    rotated ones): each connected region minus its link-only pixels,
+    dilated like CRAFT does.
+    """
+    h, w = textmap.shape
+    text_score = textmap > low_text
+    link_score = linkmap > link_threshold
+    combined = (text_score | link_score).astype(np.uint8)
+    link_only = link_score & ~text_score
+
+    n, labels, stats, _ = cv2.connectedComponentsWithStats(combined, connectivity=4)
+    boxes = []
+    for k in range(1, n):
+        x, y, bw, bh, size = stats[k]
+        if size < 10:
+            continue
+        niter = int(math.sqrt(size * min(bw, bh) / (bw * bh)) * 2)
+        sx, sy = max(0, x - niter), max(0, y - niter)
+        ex, ey = min(w, x + bw + niter + 1), min(h, y + bh + niter + 1)
+
+        component = labels[sy:ey, sx:ex] == k
+        if textmap[sy:ey, sx:ex][component].max() < text_threshold:
+            continue
+        segmap = (component & ~link_only[sy:ey, sx:ex]).astype(np.uint8)
+        segmap = cv2.dilate(segmap, cv2.getStructuringElement(cv2.MORPH_RECT, (1 + niter, 1 + niter)))
+        ys, xs = np.nonzero(segmap)
+        if len(xs) == 0:
+            continue
+        boxes.append((sx + xs.min(), sy + ys.min(), sx + xs.max() + 1, sy + ys.max() + 1))
+    return boxes
+
+
+def _with_margin(l, t, r, b, add_margin: float):
+    margin = int(add_margin * min(r - l, b - t))
+    return l - margin, t - margin, r + margin, b + margin
+
+
+def group_text_boxes(boxes, ycenter_ths: float = YCENTER_THS, height_ths: float = HEIGHT_THS,
+                     width_ths: float = WIDTH_THS, add_margin: float = ADD_MARGIN):
+    """
+    Merges word boxes (l, t, r, b) into line boxes like EasyOCR's
+    group_text_box: boxes are bucketed into lines by y-center, then
+    neighbours of similar height whose gap is under `width_ths` times the
+    line height are joined. Every result is grown by `add_margin` times its
+    smaller side. Coordinates may fall outside the image; callers clip.
+    """
+    lines, line = [], []
+    for box in sorted(boxes, key=lambda b: (b[1] + b[3]) / 2):
+        ycenter, height = (box[1] + box[3]) / 2, box[3] - box[1]
+        if line and abs(np.mean([(b[1] + b[3]) / 2 for b in line]) - ycenter) \
+                >= ycenter_ths * np.mean([b[3] - b[1] for b in line]):
+            lines.append(line)
+            line = []
+        line.append(box)
+    if line:
+        lines.append(line)
+
+    merged = []
+    for line in lines:
+        groups, group, heights, x_max = [], [], [], None
+        for box in sorted(line, key=lambda b: b[0]):
+            height = box[3] - box[1]
+            if group and abs(np.mean(heights) - height) < height_ths * np.mean(heights) \
+                    and box[0] - x_max < width_ths * height:
+                group.append(box)
+                heights.append(height)
+            else:
+                if group:
+                    groups.append(group)
+                group, heights = [box], [height]
+            x_max = box[2]
+        if group:
+            groups.append(group)
+        for group in groups:
+            merged.append(_with_margin(min(b[0] for b in group), min(b[1] for b in group),
+                                       max(b[2] for b in group), max(b[3] for b in group), add_margin))
+    return merged
+
+
+def export_easyocr_models(out_dir: str = OCR_ONNX_DIR, quantize: bool = True):
+    """
+    Exports the English EasyOCR detector and recognizer to ONNX and
+    int8-quantizes their weights (dynamic quantization).
+    """
+    import torch
+    import easyocr
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(out_dir, exist_ok=True)
+    reader = easyocr.Reader(['en'], gpu=False)
+    detector = getattr(reader.detector, "module", reader.detector).eval()
+    recognizer = getattr(reader.recognizer, "module", reader.recognizer).eval()
+
+    class _Detector(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.net = detector
+
+        def forward(self, image):
+            return self.net(image)[0]
+
+    class _Recognizer(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.net = recognizer
+
+        def forward(self, image):
+            return self.net(image, None)
+
+    exports = [
+        (_Detector(), torch.randn(1, 3, 640, 640), DETECTOR_FILE,
+         {"image": {0: "batch", 2: "height", 3: "width"},
+          "logits": {0: "batch", 1: "height", 2: "width"}}),
+        (_Recognizer(), torch.randn(1, 1, REC_HEIGHT, 256), RECOGNIZER_FILE,
+         {"image": {0: "batch", 3: "width"}, "logits": {0: "batch", 1: "steps"}}),
+    ]
+    for module, dummy, filename, axes in exports:
+        target = os.path.join(out_dir, filename)
+        fp32 = target.replace("_int8", "_fp32") if quantize else target
+        with torch.no_grad():
+            torch.onnx.export(module, dummy, fp32, input_names=["image"], output_names=["logits"],
+                              dynamic_axes=axes, opset_version=13)
+        if quantize:
+            quantize_dynamic(fp32, target, weight_type=QuantType.QInt8)
+        print(f"Exported {target}")
+
+    with open(os.path.join(out_dir, CHARSET_FILE), "w", encoding="utf-8") as f:
+        json.dump({"characters": reader.character}, f, ensure_ascii=False)
+
+
+def _iou(a, b):
+    l, t = max(a[0], b[0]), max(a[1], b[1])
+    r, btm = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0, r - l) * max(0, btm - t)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union else 0.0
+
+
+def _ltrb(bbox):
+    xs = [pt[0] for pt in bbox]
+    ys = [pt[1] for pt in bbox]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def compare_backends(image_paths, model_dir: str = OCR_ONNX_DIR, repeats: int = 3):
+    """
+    Runs the PyTorch EasyOCR reader and OnnxOCR over the same screenshots.
+    Reports per-image median latency and how many EasyOCR words the ONNX
+    backend reproduced (same text, IoU >= 0.5), plus character error rate.
+    """
+    from GUI_functions import get_reader
+    from screen_text_index import edit_distance
+
+    reference = get_reader()
+    onnx = OnnxOCR(model_dir)
+
+    rows = []
+    for path in image_paths:
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            print(f"Skipping unreadable image: {path}")
+            continue
+
+        timings, outputs = {}, {}
+        for name, engine in (("easyocr", reference), ("onnx", onnx)):
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                outputs[name] = engine.readtext(img)
+                times.append(time.perf_counter() - start)
+            timings[name] = sorted(times)[len(times) // 2]
+
+        ref_words = [(_ltrb(b), t.lower()) for b, t, _ in outputs["easyocr"]]
+        onnx_words = [(_ltrb(b), t.lower()) for b, t, _ in outputs["onnx"]]
+        hits, errors, chars = 0, 0, 0
+        for box, text in ref_words:
+            best = max(onnx_words, key=lambda w: _iou(box, w[0]), default=None)
+            got = best[1] if best and _iou(box, best[0]) >= 0.5 else ""
+            hits += got == text
+            errors += edit_distance(text, got)
+            chars += len(text)
+        rows.append((os.path.basename(path), timings["easyocr"], timings["onnx"],
+                     hits / len(ref_words) if ref_words else 1.0,
+                     errors / chars if chars else 0.0))
+
+    print(f"{'image':30} {'easyocr ms':>10} {'onnx ms':>10} {'speedup':>8} {'word recall':>12} {'CER':>6}")
+    for name, t_ref, t_onnx, recall, cer in rows:
+        print(f"{name[:30]:30} {t_ref * 1000:10.0f} {t_onnx * 1000:10.0f} "
+              f"{t_ref / t_onnx:7.1f}x {recall:12.1%} {cer:6.1%}")
+    return rows
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ONNX OCR backend tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export and quantize the EasyOCR models")
+    export.add_argument("--out_dir", type=str, default=OCR_ONNX_DIR)
+    export.add_argument("--no_quantize", action="store_true", help="Keep fp32 weights")
+    compare = sub.add_parser("compare", help="Compare against the PyTorch EasyOCR reader")
+    compare.add_argument("images", nargs="*", help="Screenshots (default: the repo's PNGs and screenshots/)")
+    compare.add_argument("--model_dir", type=str, default=OCR_ONNX_DIR)
+    compare.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.command == "export":
+        export_easyocr_models(args.out_dir, quantize=not args.no_quantize)
+    else:
+        images = args.images or sorted(glob.glob("*.png") + glob.glob("cells/*.png")
+                                       + glob.glob("screenshots/*.png"))
+        compare_backends(images, args.model_dir, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,8 @@ from pathlib import Path
 import requests
 import pyttsx3
 
+from llm_cassette import CASSETTE
+
 
 READ = True
 # Configure logging
@@ -231,16 +233,21 @@ class CodeExecutor:
                 "content": f"Generate response for the following request: {english_request}"
             })
             
-            response = self.client.chat.completions.create(
+            request = dict(
                 model="gpt-4-turbo-preview",
                 messages=messages,
                 temperature=0.1,
                 max_tokens=1000,
                 response_format={ "type": "json_object" }
             )
+            # recorded / served from the cassette when LLM_CASSETTE is set
+            content = CASSETTE.complete(
+                "code_executor", request,
+                lambda: self.client.chat.completions.create(**request).choices[0].message.content,
+            )
             
             # Parse the JSON response
-            response_data = json.loads(response.choices[0].message.content.strip())
+            response_data = json.loads(content.strip())
             return response_data
         except Exception as e:
             logging.error(f"Error generating response: {str(e)}")
@@ -0,0 +1,159 @@
+import os
+import re
+import json
+import time
+import logging
+from typing import Optional, Dict, List
+
+import cv2
+import numpy as np
+
+from GUI_functions import get_screen_capture
+
+# Plans the model returned for an objective, replayed without an LLM call
+# when the same objective reaches the same step on a similar-looking screen.
+PLAN_CACHE_FILE = os.getenv("PLAN_CACHE_FILE", "plan_cache.json")
+PLAN_CACHE_ENABLED = os.getenv("PLAN_CACHE", "1") == "1"
+PLAN_CACHE_MAX_ENTRIES = int(os.getenv("PLAN_CACHE_MAX_ENTRIES", "200"))
+PLAN_CACHE_MAX_AGE_DAYS = float(os.getenv("PLAN_CACHE_MAX_AGE_DAYS", "14"))
+
+FINGERPRINT_SIZE = 16           # dHash grid: FINGERPRINT_SIZE ** 2 bits
+FINGERPRINT_MAX_DISTANCE = 12   # differing bits still treated as the same screen
+
+
+def normalize_objective(aim: str) -> str:
+    """Lower-case, punctuation-free, single-spaced form of an objective."""
+    return " ".join(re.sub(r"[^\w\s]", " ", aim.lower()).split())
+
+
+def screen_fingerprint(img_gray: np.ndarray = None, size: int = FINGERPRINT_SIZE) -> str:
+    """
+    Difference hash (dHash) of the screen as a hex string: each bit says
+    whether a cell of a `size` x `size` grid is brighter than its right
+    neighbour. Small changes (clock, cursor) flip few bits; another window
+    or page flips many.
+    """
+    if img_gray is None:
+        capture = get_screen_capture()
+        capture.grab()
+        img_gray = capture.small()
+    cells = cv2.resize(img_gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (cells[:, 1:] > cells[:, :-1]).flatten()
+    return "%0*x" % (size * size // 4, int("".join("1" if b else "0" for b in bits), 2))
+
+
+def fingerprint_distance(a: str, b: str) -> int:
+    """Number of differing bits between two fingerprints."""
+    if len(a) != len(b):
+        return len(a) * 4
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+class PlanCache:
+    """
+    Persistent map from (normalized objective, step index, screen
+    fingerprint) to an action list that was executed successfully.
+
+    Entries are stored in a JSON file, matched by the closest fingerprint
+    within FINGERPRINT_MAX_DISTANCE, evicted when older than `max_age_days`
+    or least recently used beyond `max_entries`, and dropped as soon as a
+    replayed plan fails. With `enabled` False it never hits or stores.
+    """
+
+    def __init__(
+        self,
+        cache_file: str = PLAN_CACHE_FILE,
+        max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+        max_age_days: float = PLAN_CACHE_MAX_AGE_DAYS,
+        max_distance: int = FINGERPRINT_MAX_DISTANCE,
+        enabled: bool = PLAN_CACHE_ENABLED,
+    ):
+        self.cache_file = cache_file
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400
+        self.max_distance = max_distance
+        self.hits = 0
+        self.misses = 0
+        self.entries: List[Dict] = self.load()
+
+    def load(self) -> List[Dict]:
+        """Load cached plans from file."""
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading plan cache: {e}")
+        return []
+
+    def save(self):
+        """Save cached plans to file."""
+        try:
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"Error saving plan cache: {e}")
+
+    def _find(self, aim: str, step: int, fingerprint: str) -> Optional[Dict]:
+        objective = normalize_objective(aim)
+        best, best_distance = None, self.max_distance + 1
+        for entry in self.entries:
+            if entry["objective"] != objective or entry["step"] != step:
+                continue
+            distance = fingerprint_distance(entry["fingerprint"], fingerprint)
+            if distance < best_distance:
+                best, best_distance = entry, distance
+        return best
+
+    def _evict(self):
+        now = time.time()
+        self.entries = [e for e in self.entries if now - e["last_used"] <= self.max_age]
+        if len(self.entries) > self.max_entries:
+            self.entries.sort(key=lambda e: e["last_used"], reverse=True)
+            del self.entries[self.max_entries:]
+
+    def lookup(self, aim: str, step: int, fingerprint: str) -> Optional[List[Dict]]:
+        """The cached action list for this objective, step and screen, or None."""
+        if not self.enabled:
+            return None
+        entry = self._find(aim, step, fingerprint)
+        if entry is None or time.time() - entry["last_used"] > self.max_age:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry["last_used"] = time.time()
+        entry["hits"] += 1
+        self.save()
+        return entry["actions"]
+
+    def store(self, aim: str, step: int, fingerprint: str, actions: List[Dict]):
+        """Remember `actions` after they were all executed successfully."""
+        if not self.enabled or not actions:
+            return
+        entry = self._find(aim, step, fingerprint)
+        now = time.time()
+        if entry is None:
+            entry = {
+                "objective": normalize_objective(aim),
+                "step": step,
+                "fingerprint": fingerprint,
+                "created": now,
+                "hits": 0,
+            }
+            self.entries.append(entry)
+        entry["actions"] = actions
+        entry["last_used"] = now
+        self._evict()
+        self.save()
+
+    def invalidate(self, aim: str, step: int, fingerprint: str):
+        """Forget the plan for this objective, step and screen (it failed)."""
+        entry = self._find(aim, step, fingerprint)
+        if entry is not None:
+            self.entries.remove(entry)
+            self.save()
+
+    def clear(self):
+        self.entries = []
+        self.save()
@@ -0,0 +1,255 @@
+import os
+import time
+import hashlib
+import datetime
+import logging
+from types import SimpleNamespace
+
+# Explicit Gemini context cache for the static system prompt, off by
+# default: Gemini 1.5 only caches contexts of GEMINI_CACHE_MIN_TOKENS or more,
+# and the prompt is far shorter. Caching needs a pinned model version (e.g.
+# GEMINI_MODEL=gemini-1.5-flash-002); the same model serves the cached and
+# the plain path, where the prompt is sent as the system instruction.
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_CONTEXT_CACHE = os.getenv("GEMINI_CONTEXT_CACHE", "0") == "1"
+GEMINI_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CACHE_MIN_TOKENS", "32768"))
+GEMINI_CACHE_TTL = int(os.getenv("GEMINI_CACHE_TTL", "3600"))  # seconds
+
+CHARS_PER_TOKEN = 4
+
+# Prompt tokens sent to the providers, how many of them were served from the
+# provider's prompt cache, and time to first token of streamed answers.
+CACHE_METRICS = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "ttft": []}
+
+
+def record_usage(provider: str, prompt_tokens: int, cached_tokens: int):
+    CACHE_METRICS["calls"] += 1
+    CACHE_METRICS["prompt_tokens"] += prompt_tokens
+    CACHE_METRICS["cached_tokens"] += cached_tokens
+    print(f"[LLM] {provider}: {cached_tokens}/{prompt_tokens} prompt tokens from cache "
+          f"({cache_hit_ratio():.0%} overall)")
+
+
+def record_ttft(seconds: float):
+    CACHE_METRICS["ttft"].append(seconds)
+    print(f"[LLM] time to first token: {seconds * 1000:.0f} ms")
+
+
+def cache_hit_ratio() -> float:
+    """Share of all prompt tokens so far that were cache hits."""
+    if not CACHE_METRICS["prompt_tokens"]:
+        return 0.0
+    return CACHE_METRICS["cached_tokens"] / CACHE_METRICS["prompt_tokens"]
+
+
+def _field(obj, name, default=None):
+    if obj is None:
+        return default
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+
+def openai_usage(usage):
+    """(prompt_tokens, cached_tokens) from an OpenAI `usage` object."""
+    details = _field(usage, "prompt_tokens_details")
+    return _field(usage, "prompt_tokens", 0) or 0, _field(details, "cached_tokens", 0) or 0
+
+
+def gemini_usage(usage_metadata):
+    """(prompt_tokens, cached_tokens) from a Gemini `usage_metadata` object."""
+    return (_field(usage_metadata, "prompt_token_count", 0) or 0,
+            _field(usage_metadata, "cached_content_token_count", 0) or 0)
+
+
+class GeminiContextCache:
+    """
+    Keeps the static system prompt in a Gemini CachedContent so it is not
+    processed again on every step, and hands out a model bound to it.
+
+    The cache is created on first use and re-created when it expires. If it
+    can't be created (caching disabled, prompt estimated below `min_tokens`,
+    unsupported model, ...) the plain `model` is returned, with the system
+    prompt as its system instruction. A prompt that is too short is caught
+    locally, without a failing API call.
+    """
+
+    def __init__(self, system_instruction: str, model: str = GEMINI_MODEL,
+                 ttl: int = GEMINI_CACHE_TTL, enabled: bool = GEMINI_CONTEXT_CACHE,
+                 min_tokens: int = GEMINI_CACHE_MIN_TOKENS):
+        self.system_instruction = system_instruction
+        self.model_name = model
+        self.ttl = ttl
+        self.enabled = enabled
+        self._model = None
+        self._expires = 0.0
+        self._cached = False
+        tokens = len(system_instruction) // CHARS_PER_TOKEN
+        if enabled and tokens < min_tokens:
+            logging.info(f"System prompt is ~{tokens} tokens, below the {min_tokens}-token "
+                         f"minimum for a Gemini context cache; sending it uncached")
+            self.enabled = False
+
+    @property
+    def cached(self) -> bool:
+        """True while the model in use reads the prompt from a context cache."""
+        return self._cached
+
+    def model(self):
+        import google.generativeai as genai
+
+        if self._model is not None and (not self._cached or time.time() < self._expires):
+            return self._model
+
+        if self.enabled:
+            try:
+                from google.generativeai import caching
+                cache = caching.CachedContent.create(
+                    model=self.model_name,
+                    display_name="gui-agent-system-prompt",
+                    system_instruction=self.system_instruction,
+                    ttl=datetime.timedelta(seconds=self.ttl),
+                )
+                self._model = genai.GenerativeModel.from_cached_content(cached_content=cache)
+                # renew a little early so a request never races the expiry
+                self._expires = time.time() + self.ttl - 60
+                self._cached = True
+                print(f"[LLM] Gemini context cache created: {cache.name}")
+                return self._model
+            except Exception as e:
+                logging.warning(f"Gemini context cache unavailable, sending the prompt uncached: {e}")
+                self.enabled = False
+
+        self._model = genai.GenerativeModel(self.model_name,
+                                            system_instruction=self.system_instruction)
+        self._cached = False
+        return self._model
+
+
+# ---- offline stand-in ----------------------------------------------------
+
+IMAGE_TOKENS = 258   # tokens charged for one image
+
+
+class PromptCacheSimulator:
+    """
+    Offline stand-in for provider prompt caching, following the OpenAI
+    contract:
+
+    - prompts shorter than `min_tokens` are never cached;
+    - a hit covers the longest prefix seen before, in `block`-token steps;
+    - cached prefixes expire `ttl` seconds after their last use.
+
+    Messages may be OpenAI ({"role", "content"}) or Gemini ({"role",
+    "parts"}) dicts; text counts one token per 4 characters and each image
+    IMAGE_TOKENS tokens.
+    """
+
+    def __init__(self, min_tokens: int = 1024, block: int = 128, ttl: float = 300):
+        self.min_tokens = min_tokens
+        self.block = block
+        self.ttl = ttl
+        self._prefixes = {}   # digest of a block-aligned prefix -> last use
+
+    def _tokens(self, obj, out):
+        if isinstance(obj, bytes) or (isinstance(obj, str) and obj.startswith("data:image")):
+            digest = hashlib.sha1(obj if isinstance(obj, bytes) else obj.encode()).hexdigest()
+            out.extend([digest] * IMAGE_TOKENS)
+        elif isinstance(obj, str):
+            out.extend(obj[i:i + CHARS_PER_TOKEN] for i in range(0, len(obj), CHARS_PER_TOKEN))
+        elif isinstance(obj, dict):
+            for key in sorted(obj):
+                out.append(f"<{key}>")
+                self._tokens(obj[key], out)
+        elif isinstance(obj, (list, tuple)):
+            for item in obj:
+                self._tokens(item, out)
+        return out
+
+    def usage(self, messages, system: str = None) -> dict:
+        """{"prompt_tokens", "cached_tokens"} for a request with these messages."""
+        tokens = self._tokens(system or "", []) + self._tokens(list(messages), [])
+        now = time.time()
+        self._prefixes = {k: t for k, t in self._prefixes.items() if now - t <= self.ttl}
+
+        cached = 0
+        if len(tokens) >= self.min_tokens:
+            h = hashlib.sha1()
+            for start in range(0, len(tokens) - len(tokens) % self.block, self.block):
+                h.update("\x00".join(tokens[start:start + self.block]).encode())
+                end = start + self.block
+                if end < self.min_tokens:
+                    continue
+                # the digest covers the whole prefix, so a known one means all of it is cached
+                key = h.hexdigest()
+                if key in self._prefixes:
+                    cached = end
+                self._prefixes[key] = now
+        return {"prompt_tokens": len(tokens), "cached_tokens": cached}
+
+
+class FakeOpenAIClient:
+    """
+    Stand-in for `OpenAI()` (LLM_OFFLINE=1): answers every chat completion
+    with `answer` and reports usage from a PromptCacheSimulator, streamed
+    or not, in the same shape as the real client.
+    """
+
+    def __init__(self, answer: str = '[{"thought": "offline", "operation_type": "end", "summary": "offline"}]',
+                 simulator: PromptCacheSimulator = None):
+        self.answer = answer
+        self.simulator = simulator or PromptCacheSimulator()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, messages, stream=False, **kwargs):
+        counts = self.simulator.usage(messages)
+        usage = SimpleNamespace(
+            prompt_tokens=counts["prompt_tokens"],
+            completion_tokens=len(self.answer) // CHARS_PER_TOKEN,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=counts["cached_tokens"]),
+        )
+        if not stream:
+            message = SimpleNamespace(role="assistant", content=self.answer)
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+        def chunks():
+            for i in range(0, len(self.answer), 16):
+                delta = SimpleNamespace(content=self.answer[i:i + 16])
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+            yield SimpleNamespace(choices=[], usage=usage)
+        return chunks()
+
+
+class FakeGeminiModel:
+    """
+    Stand-in for `genai.GenerativeModel` (LLM_OFFLINE=1), with the system
+    instruction treated as a context-cached prefix once it is long enough.
+    """
+
+    def __init__(self, system_instruction: str = "",
+                 answer: str = '[{"thought": "offline", "operation_type": "end", "summary": "offline"}]',
+                 simulator: PromptCacheSimulator = None):
+        self.system_instruction = system_instruction
+        self.answer = answer
+        self.simulator = simulator or PromptCacheSimulator()
+
+    def generate_content(self, contents, generation_config=None, stream=False, **kwargs):
+        counts = self.simulator.usage(contents, system=self.system_instruction)
+        usage = SimpleNamespace(prompt_token_count=counts["prompt_tokens"],
+                                cached_content_token_count=counts["cached_tokens"])
+        part = SimpleNamespace(text=self.answer)
+        response = SimpleNamespace(
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+            usage_metadata=usage,
+            text=self.answer,
+        )
+        if not stream:
+            return response
+
+        class _Stream:
+            usage_metadata = usage
+
+            def __iter__(inner):
+                for i in range(0, len(self.answer), 16):
+                    yield SimpleNamespace(text=self.answer[i:i + 16])
+        return _Stream()
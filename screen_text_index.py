@@ -0,0 +1,295 @@
+from collections import Counter, namedtuple
+
+# One piece of text found on the screen. `rect` is (left, top, width, height),
+# `center` the point to click and `line` the (block_num, line_num) key for
+# Tesseract words (None for EasyOCR boxes, which are already whole phrases).
+ScreenText = namedtuple("ScreenText", ["text", "rect", "conf", "center", "line"])
+
+# A ranked query result: the entry plus its edit distance to the query.
+TextMatch = namedtuple("TextMatch", ["entry", "distance"])
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _ngrams(text: str, n: int):
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+def token_distance(pattern: str, text: str, max_distance: int = None) -> int:
+    """
+    Distance between `pattern` and the closest run of whole words in `text`.
+    0 means `pattern` occurs in `text` as is (anywhere, as a plain substring);
+    otherwise `pattern` is compared by edit distance against every run of
+    as many words as it has (one more or one fewer, for split or merged
+    words), so a typo never lets it match a few letters inside an unrelated
+    word. Returns max_distance + 1 when that bound can't be met.
+    """
+    if pattern in text:
+        return 0
+    words = text.split()
+    n = len(pattern.split())
+    limit = max_distance + 1 if max_distance is not None else None
+    best = limit if limit is not None else len(pattern) + len(text)
+    for size in (n, n - 1, n + 1):
+        if size < 1 or size > len(words):
+            continue
+        for start in range(len(words) - size + 1):
+            window = " ".join(words[start:start + size])
+            if limit is not None and abs(len(window) - len(pattern)) >= best:
+                continue
+            best = min(best, edit_distance(pattern, window, best - 1 if limit is not None else None))
+            if best == 1:
+                return best
+    return best
+
+
+def edit_distance(a: str, b: str, max_distance: int = None) -> int:
+    """Levenshtein distance between `a` and `b`, with the same early exit."""
+    if a == b:
+        return 0
+    prev = list(range(len(b) + 1))
+    for i, ac in enumerate(a, 1):
+        cur = [i] + [0] * len(b)
+        for j, bc in enumerate(b, 1):
+            cur[j] = min(prev[j - 1] + (ac != bc), prev[j] + 1, cur[j - 1] + 1)
+        if max_distance is not None and min(cur) > max_distance:
+            return max_distance + 1
+        prev = cur
+    return prev[-1]
+
+
+# Queries shorter than this are only matched exactly: with a typo allowed, a
+# short word matches too many unrelated ones ("Save" - "Have", "Open" - "Opera").
+FUZZY_MIN_LENGTH = 6
+
+
+def default_max_distance(text: str) -> int:
+    """Typos tolerated for a query: none below FUZZY_MIN_LENGTH chars, then one per 6 chars."""
+    n = len(_normalize(text))
+    return n // 6 if n >= FUZZY_MIN_LENGTH else 0
+
+
+def _line_entry(words, key) -> ScreenText:
+    """One line entry joining `words` in reading order, with their average confidence."""
+    # sort by X so words are in reading order
+    words = sorted(words, key=lambda e: e.rect[0])
+    l = min(e.rect[0] for e in words)
+    t = min(e.rect[1] for e in words)
+    r = max(e.rect[0] + e.rect[2] for e in words)
+    b = max(e.rect[1] + e.rect[3] for e in words)
+    avg_conf = sum(max(e.conf, 0) for e in words) / len(words)
+    return ScreenText(" ".join(e.text for e in words), (l, t, r - l, b - t),
+                      avg_conf, (l + (r - l) // 2, t + (b - t) // 2), key)
+
+
+class ScreenTextIndex:
+    """
+    Index over all text found on one frame, built once and queried by every
+    click lookup on that frame.
+
+    - an n-gram inverted index narrows fuzzy queries down to the entries that
+      share enough n-grams with the query to be within the allowed distance;
+    - a spatial grid of `cell` x `cell` pixel buckets answers region and
+      point queries without scanning every box.
+
+    Single words are matched against word entries, multi-word phrases against
+    line entries (Tesseract words joined per (block_num, line_num)) when the
+    index has them, otherwise against the word/phrase entries.
+    """
+
+    def __init__(self, entries, lines=None, n: int = 3, cell: int = 128):
+        self.n = n
+        self.cell = cell
+        self.entries = list(entries)
+        self.lines = list(lines or [])
+        self._words = self._build(self.entries)
+        self._lines = self._build(self.lines)
+
+    def _build(self, entries):
+        grams, grid = {}, {}
+        keys = [_normalize(e.text) for e in entries]
+        for idx, key in enumerate(keys):
+            for gram in set(_ngrams(key, self.n)):
+                grams.setdefault(gram, set()).add(idx)
+        for idx, entry in enumerate(entries):
+            for cell in self._cells(entry.rect):
+                grid.setdefault(cell, []).append(idx)
+        return {"entries": entries, "keys": keys, "grams": grams, "grid": grid}
+
+    def _cells(self, rect):
+        l, t, w, h = rect
+        for cy in range(int(t) // self.cell, int(t + h) // self.cell + 1):
+            for cx in range(int(l) // self.cell, int(l + w) // self.cell + 1):
+                yield cx, cy
+
+    # ---- builders -------------------------------------------------------
+
+    @classmethod
+    def from_ocr(cls, raw, min_confidence: float = None, **kwargs):
+        """From EasyOCR-style (bbox, text, conf) results, bbox being 4 points."""
+        entries = []
+        for bbox, detected, conf in raw:
+            if not detected.strip():
+                continue
+            if min_confidence is not None and conf < min_confidence:
+                continue
+            xs = [pt[0] for pt in bbox]
+            ys = [pt[1] for pt in bbox]
+            rect = (min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+            center = (int(sum(xs) / len(xs)), int(sum(ys) / len(ys)))
+            entries.append(ScreenText(detected, rect, conf, center, None))
+        return cls(entries, **kwargs)
+
+    @classmethod
+    def from_tesseract(cls, data: dict, min_confidence: float = None, **kwargs):
+        """
+        From a `pytesseract.image_to_data(..., output_type=Output.DICT)` result.
+        Words become word entries and each (block_num, line_num) a line entry.
+        """
+        entries, by_line = [], {}
+        for i, word in enumerate(data['text']):
+            w = word.strip()
+            if not w:
+                continue
+            conf = int(data['conf'][i] or -1)
+            if min_confidence is not None and conf < min_confidence:
+                continue
+            l, t = data['left'][i], data['top'][i]
+            width, height = data['width'][i], data['height'][i]
+            key = (data['block_num'][i], data['line_num'][i])
+            entry = ScreenText(w, (l, t, width, height), conf,
+                               (l + width // 2, t + height // 2), key)
+            entries.append(entry)
+            by_line.setdefault(key, []).append(entry)
+
+        lines = [_line_entry(words, key) for key, words in by_line.items()]
+        return cls(entries, lines, **kwargs)
+
+    @classmethod
+    def from_ocr_lines(cls, groups, min_confidence: float = None, **kwargs):
+        """
+        From lists of EasyOCR-style (bbox, text, conf) words, one list per
+        text line (e.g. per crop read as a single line). Words become word
+        entries and each list a line entry.
+        """
+        entries, lines = [], []
+        for key, group in enumerate(groups):
+            words = [e._replace(line=key) for e in cls.from_ocr(group, min_confidence).entries]
+            if words:
+                entries += words
+                lines.append(_line_entry(words, key))
+        return cls(entries, lines, **kwargs)
+
+    # ---- queries --------------------------------------------------------
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _candidates(self, part, query: str, max_distance: int):
+        """
+        Entry ids that may be within `max_distance` of `query`. By the q-gram
+        lemma such an entry shares at least len(grams) - n * max_distance of
+        the query's n-grams; when that bound is not positive, all ids qualify.
+        """
+        # counted over distinct n-grams: each edit still removes at most n of them
+        grams = set(_ngrams(query, self.n))
+        need = len(grams) - self.n * max_distance
+        if need <= 0:
+            return range(len(part["entries"]))
+        counts = Counter()
+        for gram in grams:
+            counts.update(part["grams"].get(gram, ()))
+        return [idx for idx, count in counts.items() if count >= need]
+
+    def _region_ids(self, part, rect):
+        l, t, w, h = rect
+        found = set()
+        for cell in self._cells(rect):
+            for idx in part["grid"].get(cell, ()):
+                el, et, ew, eh = part["entries"][idx].rect
+                if el < l + w and l < el + ew and et < t + h and t < et + eh:
+                    found.add(idx)
+        return found
+
+    def in_region(self, rect, lines: bool = False):
+        """Entries whose box overlaps `rect` (left, top, width, height)."""
+        part = self._lines if lines else self._words
+        return [part["entries"][idx] for idx in sorted(self._region_ids(part, rect))]
+
+    def at(self, x: int, y: int, lines: bool = False):
+        """Entries whose box contains the point (x, y)."""
+        return self.in_region((x, y, 1, 1), lines=lines)
+
+    def query(
+        self,
+        text: str,
+        *,
+        max_distance: int = None,
+        whole: bool = False,
+        rank: str = "area",
+        region=None,
+        min_confidence: float = None,
+        lines: bool = None,
+        limit: int = None,
+    ):
+        """
+        Ranked fuzzy lookup of `text` (case-insensitive).
+
+        Args:
+            text (str): word or phrase to find.
+            max_distance (int): edit operations tolerated; defaults to
+                                `default_max_distance(text)`. 0 = exact.
+            whole (bool): compare against the whole entry text instead of
+                          looking for `text` inside it (exactly as a
+                          substring, or fuzzily against whole words).
+            rank (str): tie-break after distance: "area" (largest box, then
+                        confidence) or "conf" (confidence, then area); then
+                        top-most, left-most.
+            region: optional (left, top, width, height) to search within.
+            min_confidence (float): skip entries below this confidence.
+            lines (bool): search line entries (True) or word entries (False);
+                          by default lines are used for multi-word queries.
+            limit (int): maximum number of matches to return.
+
+        Returns:
+            list[TextMatch]: best first; empty if nothing is close enough.
+        """
+        query = _normalize(text)
+        if not query:
+            return []
+        if max_distance is None:
+            max_distance = default_max_distance(query)
+
+        use_lines = (" " in query) if lines is None else lines
+        use_lines = use_lines and bool(self.lines)
+        part = self._lines if use_lines else self._words
+        ids = self._candidates(part, query, max_distance)
+        if region is not None:
+            allowed = self._region_ids(part, region)
+            ids = [idx for idx in ids if idx in allowed]
+
+        measure = edit_distance if whole else token_distance
+        matches = []
+        for idx in ids:
+            entry = part["entries"][idx]
+            if min_confidence is not None and entry.conf < min_confidence:
+                continue
+            distance = measure(query, part["keys"][idx], max_distance)
+            if distance <= max_distance:
+                matches.append(TextMatch(entry, distance))
+
+        def sort_key(match):
+            e = match.entry
+            area = e.rect[2] * e.rect[3]
+            first, second = (-area, -e.conf) if rank == "area" else (-e.conf, -area)
+            return (match.distance, first, second, e.rect[1], e.rect[0])
+
+        matches.sort(key=sort_key)
+        return matches[:limit] if limit else matches
+
+    def best(self, text: str, **kwargs):
+        """The top `query` match, or None."""
+        matches = self.query(text, limit=1, **kwargs)
+        return matches[0] if matches else None
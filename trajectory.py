@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import logging
+from collections import namedtuple
+from typing import Optional, Dict, List
+
+from action_engine import ActionEngine, ClickHandler, click_target
+from plan_cache import normalize_objective
+
+# Completed runs of an objective, replayed without the LLM next time.
+TRAJECTORY_FILE = os.getenv("TRAJECTORY_FILE", "trajectories.json")
+TRAJECTORY_REPLAY = os.getenv("TRAJECTORY_REPLAY", "1") == "1"
+REPLAY_CHECK_TIMEOUT = float(os.getenv("REPLAY_CHECK_TIMEOUT", "3"))  # seconds to wait for a checkpoint
+
+# done: the whole trajectory ran (up to its "end" action); executed: the
+# actions that were replayed; diverged: the step whose checkpoint failed.
+ReplayResult = namedtuple("ReplayResult", ["done", "executed", "diverged"])
+
+
+def make_step(action: Dict) -> Dict:
+    """
+    A trajectory step: the action plus its checkpoint, the text that must be
+    on screen before it runs (the click target; None for other actions).
+    """
+    expect = click_target(action) if action['operation_type'] == "click" else None
+    return {"action": action, "expect": expect}
+
+
+class TrajectoryStore:
+    """
+    Successful action sequences per objective, kept in a JSON file.
+    Each objective keeps its latest completed run.
+    """
+
+    def __init__(self, store_file: str = TRAJECTORY_FILE):
+        self.store_file = store_file
+        self.trajectories: Dict[str, Dict] = self.load()
+
+    def load(self) -> Dict[str, Dict]:
+        """Load trajectories from file."""
+        try:
+            if os.path.exists(self.store_file):
+                with open(self.store_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except Exception as e:
+            logging.error(f"Error loading trajectories: {e}")
+        return {}
+
+    def save(self):
+        """Save trajectories to file."""
+        try:
+            with open(self.store_file, 'w', encoding='utf-8') as f:
+                json.dump(self.trajectories, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            logging.error(f"Error saving trajectories: {e}")
+
+    def get(self, aim: str) -> Optional[Dict]:
+        return self.trajectories.get(normalize_objective(aim))
+
+    def record(self, aim: str, actions: List[Dict]):
+        """Store the actions of a run that completed `aim`."""
+        if not actions:
+            return
+        key = normalize_objective(aim)
+        previous = self.trajectories.get(key, {})
+        self.trajectories[key] = {
+            "aim": aim,
+            "recorded": time.time(),
+            "runs": previous.get("runs", 0) + 1,
+            "steps": [make_step(action) for action in actions],
+        }
+        self.save()
+
+    def remove(self, aim: str):
+        if self.trajectories.pop(normalize_objective(aim), None) is not None:
+            self.save()
+
+
+def replay_trajectory(store: TrajectoryStore, aim: str, debug: bool = True) -> ReplayResult:
+    """
+    Re-executes the stored trajectory for `aim` without the LLM.
+
+    Before every click, its checkpoint text has to show up on screen within
+    REPLAY_CHECK_TIMEOUT (checked through the cached OCR index, so an
+    unchanged screen costs no OCR). At the first checkpoint that fails the
+    replay stops, and the caller hands over to the model from there.
+    """
+    trajectory = store.get(aim) if TRAJECTORY_REPLAY else None
+    if not trajectory:
+        return ReplayResult(False, [], None)
+
+    print(f"[REPLAY] {len(trajectory['steps'])} recorded step(s) for '{trajectory['aim']}'")
+    checkpoints = ClickHandler([s["expect"] for s in trajectory["steps"] if s["expect"]],
+                               wait=REPLAY_CHECK_TIMEOUT, debug=debug)
+    engine = ActionEngine({"click": checkpoints}, debug=debug)
+    result = engine.run(step["action"] for step in trajectory["steps"])
+    if result.failure is not None:
+        diverged = make_step(result.failure.action)
+        print(f"[REPLAY] checkpoint '{diverged['expect']}' not on screen, handing over to the model")
+        return ReplayResult(False, result.executed, diverged)
+    if result.done:
+        print(f"[REPLAY] done in {len(result.executed)} action(s)")
+    return ReplayResult(result.done, result.executed, None)